@@ -4,22 +4,37 @@ from db import supabase
 import datetime
 
 class BaseAgent(ABC):
+    # Events are buffered and written to run_events in one insert per interval
+    EVENT_FLUSH_INTERVAL = 0.25
+    # Progress writes smaller than this many points are skipped; the rest are coalesced
+    # and written by the same flusher, so a hot loop costs at most one write per interval
+    PROGRESS_MIN_DELTA = 5
+
     def __init__(self, run_id: str, session_id: str, target_url: str):
         self.run_id = run_id
         self.session_id = session_id
         self.target_url = target_url
         self.log_buffer = []
         self._repro_steps = []  # Tracks reproduction steps for findings
+        self._event_buf = []
+        self._flush_task = None
+        self._write_task = None
+        self._last_progress = None
+        self._pending_progress = None
 
     async def run(self):
         """Main execution method to be implemented by agents."""
         await self.update_status("RUNNING")
+        status = "FAILED"
         try:
             await self.execute()
-            await self.update_status("COMPLETED")
+            status = "COMPLETED"
         except Exception as e:
             await self.emit_event("ERROR", f"Agent failed: {str(e)}")
-            await self.update_status("FAILED")
+        finally:
+            # Make sure every buffered event lands before the final status flips
+            await self.flush_events()
+        await self.update_status(status)
 
     @abstractmethod
     async def execute(self):
@@ -58,17 +73,26 @@ class BaseAgent(ABC):
     # ---------- Core Methods ----------
 
     async def update_status(self, status: str):
-        supabase.table('agent_sessions').update({
+        # supabase-py is blocking; every write runs in a thread so concurrent agents keep going
+        query = supabase.table('agent_sessions').update({
             "status": status,
             "updated_at": datetime.datetime.now().isoformat()
-        }).eq("id", self.session_id).execute()
+        }).eq("id", self.session_id)
+        await asyncio.to_thread(query.execute)
 
     async def update_progress(self, progress: int):
-        supabase.table('agent_sessions').update({
-            "progress": progress
-        }).eq("id", self.session_id).execute()
+        if (
+            self._last_progress is not None
+            and progress < 100
+            and abs(progress - self._last_progress) < self.PROGRESS_MIN_DELTA
+        ):
+            return
+        self._last_progress = progress
+        self._pending_progress = progress
+        self._ensure_flusher()
 
     async def emit_event(self, event_type: str, message: str, data: dict = None):
+        """Queue an event; a background task writes queued events in batches."""
         event = {
             "run_id": self.run_id,
             "agent_type": self.__class__.__name__,
@@ -76,11 +100,53 @@ class BaseAgent(ABC):
             "message": message,
             "data": data or {}
         }
+        self._event_buf.append(event)
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._event_buf or self._pending_progress is not None:
+            await asyncio.sleep(self.EVENT_FLUSH_INTERVAL)
+            # Shielded so flush_events() can stop the loop without abandoning a write in flight
+            self._write_task = asyncio.ensure_future(self._write_pending())
+            await asyncio.shield(self._write_task)
+
+    async def _write_pending(self):
+        batch, self._event_buf = self._event_buf, []
+        progress, self._pending_progress = self._pending_progress, None
+        if batch:
+            await asyncio.to_thread(self._write_events, batch)
+        if progress is not None:
+            await asyncio.to_thread(self._write_progress, progress)
+
+    def _write_events(self, batch):
         try:
-            supabase.table('run_events').insert(event).execute()
+            supabase.table('run_events').insert(batch).execute()
         except Exception as e:
             print(f"Failed to emit event: {e}")
 
+    def _write_progress(self, progress):
+        try:
+            supabase.table('agent_sessions').update({
+                "progress": progress
+            }).eq("id", self.session_id).execute()
+        except Exception as e:
+            print(f"Failed to update progress: {e}")
+
+    async def flush_events(self):
+        """Write any buffered events and pending progress now and stop the background flusher."""
+        if self._flush_task is not None and not self._flush_task.done():
+            self._flush_task.cancel()
+        self._flush_task = None
+        if self._write_task is not None:
+            # Let an in-flight batch land first so events keep their order
+            await self._write_task
+            self._write_task = None
+        await self._write_pending()
+
     async def report_finding(self, severity: str, title: str, evidence: str, recommendation: str, steps: list = None) -> str:
         """Report a vulnerability finding with optional reproduction steps. Returns the finding ID."""
         finding = {
@@ -91,19 +157,19 @@ class BaseAgent(ABC):
             "evidence": evidence,
             "recommendation": recommendation
         }
+        # Take the steps (explicit or accumulated) before the first await: concurrent
+        # workers of one agent may step()/clear_steps() while the insert is in flight
+        repro = list(steps or self._repro_steps)
+        self.clear_steps()
         try:
-            result = supabase.table('findings').insert(finding).execute()
+            result = await asyncio.to_thread(supabase.table('findings').insert(finding).execute)
             if result.data and len(result.data) > 0:
                 finding_id = result.data[0].get("id", "")
-                # Emit reproduction steps (use explicit steps or accumulated self._repro_steps)
-                repro = steps if steps else self._repro_steps
                 if repro and finding_id:
-                    await self._emit_repro_steps(finding_id, list(repro))
-                self.clear_steps()
+                    await self._emit_repro_steps(finding_id, repro)
                 return finding_id
         except Exception as e:
             print(f"Failed to report finding: {e}")
-        self.clear_steps()
         return ""
 
 
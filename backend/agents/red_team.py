@@ -725,8 +725,8 @@ Attach a finding whenever you confirm something:
 
     async def _tool_screenshot(self, args: Dict) -> str:
         label = args.get("label", "evidence")
-        screenshot = await self.page.screenshot()
-        b64 = base64.b64encode(screenshot).decode("utf-8")
+        # Viewport-only JPEG: a fraction of a full PNG's size and capture time
+        screenshot = await self.page.screenshot(full_page=False, type="jpeg", quality=70)
         await self.emit_event("INFO", f"📸 Screenshot '{label}' captured ({len(screenshot)} bytes)")
         return f"Screenshot '{label}' captured."
 
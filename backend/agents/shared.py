@@ -0,0 +1,143 @@
+"""
+Process-level shared resources for agents.
+
+Launching Chromium and opening a fresh aiohttp connection pool costs real
+time on every agent run. Agents running in the same worker process share one
+browser and one HTTP session instead; each agent still opens its own
+BrowserContext so cookies/storage stay isolated per run.
+
+Call close_shared_resources() once when the process shuts down.
+
+Also holds small helpers the fuzzing agents share.
+"""
+
+import asyncio
+import importlib.util
+import urllib.parse
+import aiohttp
+
+# aiodns enables aiohttp's non-threaded AsyncResolver; aiohttp imports it itself when present
+_HAS_AIODNS = importlib.util.find_spec("aiodns") is not None
+
+_browser_lock = asyncio.Lock()
+_playwright = None
+_browser = None
+
+_session = None
+_session_loop = None
+
+# Resource types a scan never needs to find inputs or read responses
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "font", "stylesheet", "media"})
+# Analytics/tracker hosts; their scripts only add load time
+BLOCKED_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+    "hotjar.com", "segment.io", "cdn.segment.com",
+)
+
+
+def make_connector() -> aiohttp.TCPConnector:
+    """Pooled keep-alive connector; uses aiodns when available instead of the getaddrinfo thread pool."""
+    kwargs = {"limit": 100, "limit_per_host": 20, "ttl_dns_cache": 300}
+    if _HAS_AIODNS:
+        kwargs["resolver"] = aiohttp.AsyncResolver()
+    return aiohttp.TCPConnector(**kwargs)
+
+
+async def get_browser():
+    """Return the shared headless Chromium, launching it on first use."""
+    global _playwright, _browser
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _playwright is None:
+                # Imported lazily so HTTP-only agents don't need Playwright installed
+                from playwright.async_api import async_playwright
+                _playwright = await async_playwright().start()
+            _browser = await _playwright.chromium.launch(headless=True)
+        return _browser
+
+
+async def _block_assets(route):
+    request = route.request
+    host = urllib.parse.urlsplit(request.url).hostname or ""  # None for data:/blob: URLs
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or host.endswith(BLOCKED_HOSTS):
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def block_static_assets(context):
+    """Abort image/font/CSS/media and analytics requests in a BrowserContext (or a single Page).
+
+    Leave it off for contexts that take screenshots, which need the page to render.
+    """
+    await context.route("**/*", _block_assets)
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session. Callers must not close it."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session = aiohttp.ClientSession(connector=make_connector())
+        _session_loop = loop
+    return _session
+
+
+async def close_shared_resources():
+    """Close the shared browser and HTTP session (call on process shutdown)."""
+    global _playwright, _browser, _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    if _browser is not None:
+        try:
+            await _browser.close()
+        except Exception:
+            pass
+    _browser = None
+    if _playwright is not None:
+        await _playwright.stop()
+    _playwright = None
+
+
+def inject_query(query_pairs, param: str, encoded_value: str) -> str:
+    """Rebuild a query string with every occurrence of `param` set to an already-encoded value.
+
+    query_pairs is [(raw "name=value" pair, raw name), ...], split once per URL, so each
+    probe only splices one value instead of re-encoding the whole query.
+    """
+    return "&".join(
+        f"{name}={encoded_value}" if urllib.parse.unquote_plus(name) == param else pair
+        for pair, name in query_pairs
+    )
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit for probing one target.
+
+    The limit grows by about one slot per window of successful requests and is halved
+    whenever a request is throttled (429/503) or fails, so a rate-limited target gets
+    fewer parallel probes instead of a growing backlog of timeouts.
+    """
+
+    THROTTLE_STATUSES = frozenset({429, 503})
+
+    def __init__(self, initial: int = 4, maximum: int = 20):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self._in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._in_flight < int(self.limit))
+            self._in_flight += 1
+
+    async def release(self, throttled: bool):
+        async with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._cond.notify_all()
@@ -13,20 +13,147 @@ This agent runs FIRST and stores its data so other agents can be smarter.
 """
 
 from .base import BaseAgent
-from playwright.async_api import async_playwright
+from .shared import get_browser, get_http_session
 import aiohttp
 import asyncio
+import itertools
 import json
 import re
+import secrets
 from urllib.parse import urljoin, urlparse, urlunparse
 from collections import defaultdict
+from selectolax.lexbor import LexborHTMLParser
+
+
+# Frontier entries with these extensions are assets, not pages — skip them in the BFS
+STATIC_EXTENSIONS = (
+    ".jpg", ".jpeg", ".png", ".gif", ".svg", ".ico", ".webp",
+    ".pdf", ".css", ".js", ".woff", ".woff2", ".ttf", ".mp4", ".webm", ".zip",
+    ".xml", ".txt",
+)
+
+
+# Client-rendered frameworks whose routes need a real browser to expose links/forms
+SPA_FRAMEWORKS = {"React", "Vue.js", "Angular", "Next.js", "Nuxt.js", "Ember.js", "Svelte", "Gatsby"}
+
+# Substrings that mark a network request as an API call worth recording
+_API_HINT_RE = re.compile(r"/api/|/rest/|/graphql|/v1/|/v2/|/auth/|supabase\.co|firebase")
+
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+MAX_EMAIL_SCAN_CHARS = 200_000
+MAX_EMAIL_MATCHES = 50
+
+# Enumerates every form plus the loose inputs outside forms (SPA search bars etc.) in one evaluate
+_FORM_ENUM_JS = """() => ({
+    forms: [...document.querySelectorAll('form')].map(form => ({
+        action: form.action || '',
+        method: (form.method || 'GET').toUpperCase(),
+        inputs: [...form.querySelectorAll('input, textarea, select')].map(inp => ({
+            tag: inp.tagName.toLowerCase(),
+            type: inp.type || 'text',
+            name: inp.name || inp.id || '',
+            placeholder: inp.placeholder || '',
+            required: inp.required,
+            autocomplete: inp.autocomplete || '',
+        })),
+        has_csrf: !!form.querySelector('input[name*="csrf"], input[name*="token"], input[name*="_token"]'),
+        has_file_upload: !!form.querySelector('input[type="file"]'),
+    })),
+    looseInputs: [...document.querySelectorAll('input:not(form input), textarea:not(form textarea)')].map(inp => ({
+        type: inp.type || 'text',
+        name: inp.name || inp.id || inp.placeholder || '',
+        context: inp.closest('div, section, nav')?.className?.substring(0, 100) || '',
+    })),
+})"""
+
+
+# <input> types the DOM reports as written; anything else reads back as "text" from inp.type
+_INPUT_TYPES = frozenset({
+    "hidden", "text", "search", "tel", "url", "email", "password", "date", "month", "week",
+    "time", "datetime-local", "number", "range", "color", "checkbox", "radio", "file",
+    "submit", "image", "reset", "button",
+})
+_FORM_METHODS = ("get", "post", "dialog")
+
+
+def _input_type(node) -> str:
+    """Return the type the browser reports for an input, textarea or select node (inp.type)."""
+    if node.tag == "textarea":
+        return "textarea"
+    if node.tag == "select":
+        return "select-multiple" if "multiple" in node.attributes else "select-one"
+    kind = (node.attributes.get("type") or "").strip().lower()
+    return kind if kind in _INPUT_TYPES else "text"
+
+
+def _normalize_url(u: str) -> str:
+    """Canonicalize a URL so trivially different variants dedupe to one entry.
+
+    Lowercases scheme/host, strips default ports, drops query/fragment and any
+    trailing slash.
+    """
+    p = urlparse(u)
+    scheme = p.scheme.lower()
+    netloc = p.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = p.path.rstrip("/") or "/"
+    return urlunparse((scheme, netloc, path, "", "", ""))
+
+
+def _is_static_asset(u: str) -> bool:
+    return urlparse(u).path.lower().endswith(STATIC_EXTENSIONS)
+
+
+def _extract_links_and_forms(html: str, page_url: str, base_host: str):
+    """Parse rendered HTML locally and return (same-host links, forms).
+
+    Form records carry the same keys and browser-normalized values as _FORM_ENUM_JS,
+    so results can be merged with forms found via page.evaluate.
+    """
+    tree = LexborHTMLParser(html)
+
+    links = []
+    for a in tree.css("a[href]"):
+        href = (a.attributes.get("href") or "").strip()
+        if not href or href.startswith(("javascript:", "mailto:", "tel:")):
+            continue
+        url = urljoin(page_url, href)
+        if urlparse(url).hostname == base_host:
+            links.append(url.split("#")[0].split("?")[0])
+
+    forms = []
+    for form in tree.css("form"):
+        inputs = []
+        for inp in form.css("input, textarea, select"):
+            attrs = inp.attributes
+            inputs.append({
+                "tag": inp.tag,
+                "type": _input_type(inp),
+                "name": attrs.get("name") or attrs.get("id") or "",
+                "placeholder": "" if inp.tag == "select" else attrs.get("placeholder") or "",
+                "required": "required" in attrs,
+                "autocomplete": " ".join((attrs.get("autocomplete") or "").lower().split()),
+            })
+        if inputs:
+            attrs = form.attributes
+            method = (attrs.get("method") or "").strip().lower()
+            forms.append({
+                "action": urljoin(page_url, attrs.get("action") or ""),
+                "method": (method if method in _FORM_METHODS else "get").upper(),
+                "inputs": inputs,
+                "has_csrf": form.css_first('input[name*="csrf"], input[name*="token"], input[name*="_token"]') is not None,
+                "has_file_upload": any(i["tag"] == "input" and i["type"] == "file" for i in inputs),
+            })
+
+    return links, forms
 
 
 class SpiderAgent(BaseAgent):
     """Full-site crawler / attack surface mapper."""
 
     # Common hidden/sensitive paths to probe
-    SENSITIVE_PATHS = [
+    SENSITIVE_PATHS = (
         "/robots.txt", "/sitemap.xml", "/.well-known/security.txt",
         "/.env", "/.env.local", "/.env.production",
         "/.git/config", "/.git/HEAD",
@@ -50,7 +177,115 @@ class SpiderAgent(BaseAgent):
         "/test", "/testing", "/staging",
         "/cgi-bin/", "/cgi-bin/test-cgi",
         "/_next/data", "/__nextjs_original-stack-frame",
-    ]
+    )
+
+    # Wall-clock cap for the whole sensitive-path probe phase
+    PROBE_BUDGET_SECONDS = 15
+
+    async def _fingerprint_not_found(self, session):
+        """Request a few random nonexistent paths to learn the server's catch-all response.
+
+        Returns (status, content_length) if all of them answered the same way,
+        otherwise None.
+        """
+        async def probe_random():
+            url = self.target_url.rstrip("/") + "/___sentinel_noexist_" + secrets.token_hex(6)
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=False, ssl=False) as resp:
+                    return resp.status, int(resp.headers.get("Content-Length", 0))
+            except Exception:
+                return None
+
+        results = await asyncio.gather(*(probe_random() for _ in range(3)))
+        if any(r is None for r in results):
+            return None
+        statuses = {status for status, _ in results}
+        lengths = [length for _, length in results]
+        if len(statuses) == 1 and max(lengths) - min(lengths) < 64:
+            return results[0]
+        return None
+
+    async def _probe_sensitive(self) -> list:
+        """Probe SENSITIVE_PATHS over plain HTTP and return the accessible ones."""
+        discovered_sensitive = []
+        session = get_http_session()
+        sem = asyncio.Semaphore(5)
+        catch_all = await self._fingerprint_not_found(session)
+        
+        async def probe_path(path, url):
+            async with sem:
+                try:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=False, ssl=False) as resp:
+                        status = resp.status
+                        content_length = int(resp.headers.get("Content-Length", 0))
+                        content_type = resp.headers.get("Content-Type", "")
+                        
+                        # Same answer the server gives for made-up paths — not a real hit
+                        if catch_all and status == catch_all[0] and abs(content_length - catch_all[1]) < 64:
+                            return None
+                        
+                        if status == 200 and content_length > 0:
+                            body = await resp.text()
+                            if len(body.strip()) > 10:  # Not empty
+                                return {
+                                    "path": path,
+                                    "status": status,
+                                    "size": len(body),
+                                    "content_type": content_type,
+                                    "preview": body[:200],
+                                }
+                        elif status in (301, 302, 303, 307, 308):
+                            location = resp.headers.get("Location", "")
+                            return {
+                                "path": path,
+                                "status": status,
+                                "redirect": location,
+                            }
+                except Exception:
+                    pass
+                return None
+        
+        # Bound the phase by a wall-clock budget so a few hung connections can't stall it
+        probe_base = self.target_url.rstrip("/")
+        tasks = [asyncio.create_task(probe_path(path, probe_base + path)) for path in self.SENSITIVE_PATHS]
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=self.PROBE_BUDGET_SECONDS):
+                try:
+                    result = await next_done
+                except asyncio.TimeoutError:
+                    break
+                if result:
+                    discovered_sensitive.append(result)
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+        return discovered_sensitive
+
+    async def _fetch_pages(self, urls: list, base_host: str) -> list:
+        """Fetch pages over plain HTTP and parse them locally.
+
+        Returns one (links, forms) tuple per URL, or None where the page has to
+        go through the browser instead (HTTP error, non-HTML, JS-only shell).
+        """
+        session = get_http_session()
+        sem = asyncio.Semaphore(10)
+        
+        async def fetch_and_parse(url):
+            async with sem:
+                try:
+                    async with session.get(url, timeout=aiohttp.ClientTimeout(total=8), ssl=False) as resp:
+                        if resp.status >= 400 or "html" not in resp.headers.get("Content-Type", ""):
+                            return None
+                        html = await resp.text()
+                except Exception:
+                    return None
+            links, forms = _extract_links_and_forms(html, url, base_host)
+            if not links and not forms and "<noscript" in html.lower():
+                return None
+            return links, forms
+        
+        return await asyncio.gather(*(fetch_and_parse(u) for u in urls))
 
     async def execute(self):
         await self.emit_event("INFO", "🕷️ Starting Attack Surface Mapping...")
@@ -66,410 +301,337 @@ class SpiderAgent(BaseAgent):
         base_parsed = urlparse(self.target_url)
         base_domain = base_parsed.netloc
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Sentinel-Spider/1.0"
-            )
+        # Shared per-process browser; only this run's context is closed at the end
+        browser = await get_browser()
+        context = await browser.new_context(
+            user_agent="Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 Sentinel-Spider/1.0"
+        )
+        
+        # Capture all network requests
+        api_requests = []
+        
+        def on_request(req):
+            # Hot path: fires for every subresource, so avoid urlparse here
+            url = req.url
+            if _API_HINT_RE.search(url):
+                api_requests.append({"url": url, "method": req.method, "type": req.resource_type})
+            # Track external services
+            if not url.startswith(("http://", "https://")):
+                return
+            netloc = url.split("/", 3)[2].rpartition("@")[2]
+            if netloc and netloc != base_domain:
+                external_services.add(netloc)
+        
+        page = await context.new_page()
+        page.on("request", on_request)
+        probe_task = None
+        
+        try:
+            await self.update_progress(5)
             
-            # Capture all network requests
-            api_requests = []
+            # ===== Phase 1: Initial page crawl =====
+            await self.emit_event("INFO", "📄 Phase 1: Crawling main page and collecting links...")
+            await page.goto(self.target_url, timeout=30000, wait_until="domcontentloaded")
+            await asyncio.sleep(2)
             
-            def on_request(req):
-                url = req.url
-                if any(p in url for p in ["/api/", "/rest/", "/graphql", "/v1/", "/v2/", "/auth/", "supabase.co", "firebase"]):
-                    api_requests.append({"url": url, "method": req.method, "type": req.resource_type})
-                # Track external services
-                parsed = urlparse(url)
-                if parsed.netloc and parsed.netloc != base_domain:
-                    external_services.add(parsed.netloc)
+            discovered_urls.add(_normalize_url(self.target_url))
             
-            page = await context.new_page()
-            page.on("request", on_request)
+            # Extract all links
+            links = await page.evaluate(f"""() => {{
+                const base = "{self.target_url.rstrip('/')}";
+                const domain = "{base_domain}";
+                const links = new Set();
+                
+                // All anchor tags
+                document.querySelectorAll('a[href]').forEach(a => {{
+                    try {{
+                        const url = new URL(a.href, base);
+                        if (url.hostname === domain || url.hostname === '') {{
+                            links.add(url.href.split('#')[0].split('?')[0]);
+                        }}
+                    }} catch(e) {{}}
+                }});
+                
+                // Hash-based routes (SPA)
+                const hash = window.location.hash;
+                if (hash) links.add(base + hash);
+                
+                // Links in onclick handlers
+                document.querySelectorAll('[onclick]').forEach(el => {{
+                    const onclick = el.getAttribute('onclick');
+                    const match = onclick.match(/['"](\\/[^'"]+)['"]/);
+                    if (match) links.add(base + match[1]);
+                }});
+                
+                return [...links];
+            }}""")
             
-            try:
-                await self.update_progress(5)
-                
-                # ===== Phase 1: Initial page crawl =====
-                await self.emit_event("INFO", "📄 Phase 1: Crawling main page and collecting links...")
-                await page.goto(self.target_url, timeout=30000, wait_until="domcontentloaded")
-                await asyncio.sleep(2)
-                
-                discovered_urls.add(self.target_url)
-                
-                # Extract all links
-                links = await page.evaluate(f"""() => {{
-                    const base = "{self.target_url.rstrip('/')}";
-                    const domain = "{base_domain}";
-                    const links = new Set();
-                    
-                    // All anchor tags
-                    document.querySelectorAll('a[href]').forEach(a => {{
-                        try {{
-                            const url = new URL(a.href, base);
-                            if (url.hostname === domain || url.hostname === '') {{
-                                links.add(url.href.split('#')[0].split('?')[0]);
-                            }}
-                        }} catch(e) {{}}
-                    }});
-                    
-                    // Hash-based routes (SPA)
-                    const hash = window.location.hash;
-                    if (hash) links.add(base + hash);
-                    
-                    // Links in onclick handlers
-                    document.querySelectorAll('[onclick]').forEach(el => {{
-                        const onclick = el.getAttribute('onclick');
-                        const match = onclick.match(/['"](\\/[^'"]+)['"]/);
-                        if (match) links.add(base + match[1]);
-                    }});
-                    
-                    return [...links];
-                }}""")
-                
-                for link in links:
-                    discovered_urls.add(link)
-                
-                await self.emit_event("INFO", f"Found {len(discovered_urls)} links on main page")
-                await self.update_progress(15)
-                
-                # ===== Phase 2: Detect Tech Stack =====
-                await self.emit_event("INFO", "🔬 Phase 2: Fingerprinting technology stack...")
-                
-                tech_info = await page.evaluate("""() => {
-                    const tech = [];
-                    
-                    // Framework detection
-                    if (window.React || document.querySelector('[data-reactroot]') || document.querySelector('#__next')) tech.push('React');
-                    if (window.Vue || document.querySelector('[data-v-]')) tech.push('Vue.js');
-                    if (window.angular || document.querySelector('[ng-app]') || document.querySelector('[ng-controller]')) tech.push('Angular');
-                    if (window.jQuery || window.$) tech.push('jQuery');
-                    if (window.__NEXT_DATA__) tech.push('Next.js');
-                    if (window.__NUXT__) tech.push('Nuxt.js');
-                    if (window.Ember) tech.push('Ember.js');
-                    if (window.Svelte || document.querySelector('[class*="svelte-"]')) tech.push('Svelte');
-                    if (document.querySelector('script[src*="gatsby"]')) tech.push('Gatsby');
-                    if (document.querySelector('meta[name="generator"][content*="WordPress"]')) tech.push('WordPress');
-                    if (document.querySelector('meta[name="generator"][content*="Drupal"]')) tech.push('Drupal');
-                    
-                    // Service detection
-                    if (document.querySelector('script[src*="supabase"]') || window.supabase) tech.push('Supabase');
-                    if (document.querySelector('script[src*="firebase"]') || window.firebase) tech.push('Firebase');
-                    if (document.querySelector('script[src*="stripe"]')) tech.push('Stripe');
-                    if (document.querySelector('script[src*="sentry"]')) tech.push('Sentry');
-                    if (document.querySelector('script[src*="analytics"]') || window.ga || window.gtag) tech.push('Google Analytics');
-                    if (document.querySelector('script[src*="hotjar"]')) tech.push('Hotjar');
-                    if (document.querySelector('script[src*="intercom"]')) tech.push('Intercom');
-                    if (document.querySelector('script[src*="amplitude"]')) tech.push('Amplitude');
-                    if (document.querySelector('script[src*="segment"]')) tech.push('Segment');
-                    if (document.querySelector('script[src*="mixpanel"]')) tech.push('Mixpanel');
-                    if (document.querySelector('link[href*="tailwind"]') || document.querySelector('style[data-tailwind]') || document.querySelector('[class*="tw-"]')) tech.push('Tailwind CSS');
-                    if (document.querySelector('link[href*="bootstrap"]')) tech.push('Bootstrap');
-                    
-                    // Meta information
-                    const generator = document.querySelector('meta[name="generator"]');
-                    if (generator) tech.push('Generator: ' + generator.content);
-                    
-                    // PWA
-                    if (document.querySelector('link[rel="manifest"]')) tech.push('PWA Manifest');
-                    if ('serviceWorker' in navigator) tech.push('Service Worker Capable');
-                    
-                    return tech;
-                }""")
-                
-                for t in tech_info:
-                    discovered_tech.add(t)
-                
-                await self.emit_event("INFO", f"🔧 Tech stack: {', '.join(discovered_tech) or 'Unknown'}")
-                await self.update_progress(25)
-                
-                # ===== Phase 3: Deep form discovery =====
-                await self.emit_event("INFO", "📝 Phase 3: Discovering forms and input fields...")
-                
-                forms_data = await page.evaluate("""() => {
-                    const forms = [];
-                    document.querySelectorAll('form').forEach((form, idx) => {
-                        const inputs = [];
-                        form.querySelectorAll('input, textarea, select').forEach(inp => {
-                            inputs.push({
-                                tag: inp.tagName.toLowerCase(),
-                                type: inp.type || 'text',
-                                name: inp.name || inp.id || '',
-                                placeholder: inp.placeholder || '',
-                                required: inp.required,
-                                autocomplete: inp.autocomplete || '',
-                            });
-                        });
-                        forms.push({
-                            action: form.action || '',
-                            method: (form.method || 'GET').toUpperCase(),
-                            inputs: inputs,
-                            has_csrf: !!form.querySelector('input[name*="csrf"], input[name*="token"], input[name*="_token"]'),
-                            has_file_upload: !!form.querySelector('input[type="file"]'),
-                        });
-                    });
-                    return forms;
-                }""")
-                
-                discovered_forms = forms_data
-                await self.emit_event("INFO", f"Found {len(forms_data)} forms on main page")
-                
-                # Also find loose input fields (SPA search bars etc.)
-                loose_inputs = await page.evaluate("""() => {
-                    const inputs = [];
-                    document.querySelectorAll('input:not(form input), textarea:not(form textarea)').forEach(inp => {
-                        inputs.push({
-                            type: inp.type || 'text',
-                            name: inp.name || inp.id || inp.placeholder || '',
-                            context: inp.closest('div, section, nav')?.className?.substring(0, 100) || '',
-                        });
-                    });
-                    return inputs;
-                }""")
-                
-                if loose_inputs:
-                    await self.emit_event("INFO", f"Found {len(loose_inputs)} loose input fields (potential injection points)")
-                
-                await self.update_progress(35)
-                
-                # ===== Phase 4: Crawl discovered pages (BFS, depth 2) =====
-                await self.emit_event("INFO", "🕸️ Phase 4: Deep crawling discovered pages...")
-                
-                pages_to_visit = list(discovered_urls)[:20]  # Limit to 20 pages
-                visited = {self.target_url}
-                
-                for idx, page_url in enumerate(pages_to_visit):
-                    if page_url in visited:
-                        continue
-                    if not page_url.startswith(("http://", "https://")):
-                        continue
-                    if urlparse(page_url).netloc != base_domain:
-                        continue
-                        
-                    visited.add(page_url)
-                    
-                    try:
-                        await page.goto(page_url, timeout=10000, wait_until="domcontentloaded")
-                        await asyncio.sleep(1)
-                        
-                        # Get new links from this page
-                        new_links = await page.evaluate(f"""() => {{
-                            const base = "{self.target_url.rstrip('/')}";
-                            const domain = "{base_domain}";
-                            const links = [];
-                            document.querySelectorAll('a[href]').forEach(a => {{
-                                try {{
-                                    const url = new URL(a.href, base);
-                                    if (url.hostname === domain) links.push(url.href.split('#')[0].split('?')[0]);
-                                }} catch(e) {{}}
-                            }});
-                            return links;
-                        }}""")
-                        
-                        for link in new_links:
-                            discovered_urls.add(link)
-                        
-                        # Get forms from this page too
-                        page_forms = await page.evaluate("""() => {
-                            const forms = [];
-                            document.querySelectorAll('form').forEach(form => {
-                                const inputs = [];
-                                form.querySelectorAll('input, textarea, select').forEach(inp => {
-                                    inputs.push({
-                                        tag: inp.tagName.toLowerCase(),
-                                        type: inp.type || 'text',
-                                        name: inp.name || inp.id || '',
-                                    });
-                                });
-                                if (inputs.length > 0) {
-                                    forms.push({
-                                        action: form.action || '',
-                                        method: (form.method || 'GET').toUpperCase(),
-                                        inputs: inputs,
-                                        has_csrf: !!form.querySelector('input[name*="csrf"], input[name*="token"]'),
-                                    });
-                                }
-                            });
-                            return forms;
-                        }""")
-                        
-                        discovered_forms.extend(page_forms)
-                        
-                    except Exception:
+            discovered_urls.update(_normalize_url(link) for link in links if not _is_static_asset(link))
+            
+            await self.emit_event("INFO", f"Found {len(discovered_urls)} links on main page")
+            await self.update_progress(15)
+            
+            # ===== Phase 2: Detect Tech Stack =====
+            await self.emit_event("INFO", "🔬 Phase 2: Fingerprinting technology stack...")
+            
+            tech_info = await page.evaluate("""() => {
+                const tech = [];
+                
+                // Collect script srcs / link hrefs once, then do substring checks
+                const srcs = [...document.scripts].map(s => s.src).join('|');
+                const hrefs = [...document.querySelectorAll('link[href]')].map(l => l.href).join('|');
+                const hasScript = (s) => srcs.includes(s);
+                const hasLink = (s) => hrefs.includes(s);
+                const generator = document.querySelector('meta[name="generator"]');
+                const generatorContent = generator ? (generator.content || '') : '';
+                
+                // Framework detection
+                if (window.React || document.querySelector('[data-reactroot]') || document.getElementById('__next')) tech.push('React');
+                if (window.Vue || document.querySelector('[data-v-]')) tech.push('Vue.js');
+                if (window.angular || document.querySelector('[ng-app], [ng-controller]')) tech.push('Angular');
+                if (window.jQuery || window.$) tech.push('jQuery');
+                if (window.__NEXT_DATA__) tech.push('Next.js');
+                if (window.__NUXT__) tech.push('Nuxt.js');
+                if (window.Ember) tech.push('Ember.js');
+                if (window.Svelte || document.querySelector('[class*="svelte-"]')) tech.push('Svelte');
+                if (hasScript('gatsby')) tech.push('Gatsby');
+                if (generatorContent.includes('WordPress')) tech.push('WordPress');
+                if (generatorContent.includes('Drupal')) tech.push('Drupal');
+                
+                // Service detection
+                if (hasScript('supabase') || window.supabase) tech.push('Supabase');
+                if (hasScript('firebase') || window.firebase) tech.push('Firebase');
+                if (hasScript('stripe')) tech.push('Stripe');
+                if (hasScript('sentry')) tech.push('Sentry');
+                if (hasScript('analytics') || window.ga || window.gtag) tech.push('Google Analytics');
+                if (hasScript('hotjar')) tech.push('Hotjar');
+                if (hasScript('intercom')) tech.push('Intercom');
+                if (hasScript('amplitude')) tech.push('Amplitude');
+                if (hasScript('segment')) tech.push('Segment');
+                if (hasScript('mixpanel')) tech.push('Mixpanel');
+                if (hasLink('tailwind') || document.querySelector('style[data-tailwind], [class*="tw-"]')) tech.push('Tailwind CSS');
+                if (hasLink('bootstrap')) tech.push('Bootstrap');
+                
+                // Meta information
+                if (generator) tech.push('Generator: ' + generatorContent);
+                
+                // PWA
+                if (document.querySelector('link[rel="manifest"]')) tech.push('PWA Manifest');
+                if ('serviceWorker' in navigator) tech.push('Service Worker Capable');
+                
+                return tech;
+            }""")
+            
+            discovered_tech.update(tech_info)
+            is_spa = bool(discovered_tech & SPA_FRAMEWORKS)
+            
+            await self.emit_event("INFO", f"🔧 Tech stack: {', '.join(discovered_tech) or 'Unknown'}")
+            await self.update_progress(25)
+            
+            # ===== Phase 3: Deep form discovery =====
+            await self.emit_event("INFO", "📝 Phase 3: Discovering forms and input fields...")
+            
+            # Forms and loose inputs in one round-trip
+            form_info = await page.evaluate(_FORM_ENUM_JS)
+            forms_data = form_info["forms"]
+            loose_inputs = form_info["looseInputs"]
+
+            discovered_forms = forms_data
+            await self.emit_event("INFO", f"Found {len(forms_data)} forms on main page")
+            
+            if loose_inputs:
+                await self.emit_event("INFO", f"Found {len(loose_inputs)} loose input fields (potential injection points)")
+            
+            await self.update_progress(35)
+            
+            # Phase 5 only needs aiohttp, so its probes run alongside the Phase 4 crawl
+            await self.emit_event("INFO", "🔍 Phase 5: Probing for sensitive/hidden paths (in background)...")
+            probe_task = asyncio.create_task(self._probe_sensitive())
+            
+            # ===== Phase 4: Crawl discovered pages (BFS, depth 2) =====
+            await self.emit_event("INFO", "🕸️ Phase 4: Deep crawling discovered pages...")
+            
+            pages_to_visit = [
+                u for u in discovered_urls if not _is_static_asset(u)
+            ][:20]  # Limit to 20 pages
+            visited = {_normalize_url(self.target_url)}
+            base_netloc = urlparse(_normalize_url(self.target_url)).netloc
+            
+            frontier = []
+            for page_url in pages_to_visit:
+                if page_url in visited:
+                    continue
+                if not page_url.startswith(("http://", "https://")):
+                    continue
+                if urlparse(page_url).netloc != base_netloc:
+                    continue
+                visited.add(page_url)
+                frontier.append(page_url)
+            
+            # Server-rendered pages don't need a browser: fetch and parse them over HTTP,
+            # keeping Playwright for SPAs and pages the HTTP pass couldn't handle
+            browser_frontier = frontier
+            if not is_spa and frontier:
+                http_results = await self._fetch_pages(frontier, base_parsed.hostname)
+                browser_frontier = []
+                for page_url, result in zip(frontier, http_results):
+                    if result is None:
+                        browser_frontier.append(page_url)
                         continue
+                    new_links, page_forms = result
+                    discovered_urls.update(_normalize_url(link) for link in new_links if not _is_static_asset(link))
+                    discovered_forms.extend(page_forms)
+                await self.update_progress(45)
+            
+            for idx, page_url in enumerate(browser_frontier):
+                try:
+                    await page.goto(page_url, timeout=10000, wait_until="domcontentloaded")
+                    await asyncio.sleep(1)
                     
-                    progress = 35 + int((idx / max(len(pages_to_visit), 1)) * 20)
-                    await self.update_progress(min(progress, 55))
-                
-                await self.emit_event("INFO", f"Crawled {len(visited)} pages, found {len(discovered_urls)} total URLs")
-                await self.update_progress(55)
-                
-                # ===== Phase 5: Probe sensitive paths =====
-                await self.emit_event("INFO", "🔍 Phase 5: Probing for sensitive/hidden paths...")
-                
-                async with aiohttp.ClientSession() as session:
-                    sem = asyncio.Semaphore(5)
+                    # Parse the rendered DOM locally instead of walking it in-browser
+                    html = await page.content()
+                    new_links, page_forms = _extract_links_and_forms(html, page_url, base_parsed.hostname)
                     
-                    async def probe_path(path):
-                        async with sem:
-                            try:
-                                url = self.target_url.rstrip("/") + path
-                                async with session.get(url, timeout=aiohttp.ClientTimeout(total=5), allow_redirects=False, ssl=False) as resp:
-                                    status = resp.status
-                                    content_length = int(resp.headers.get("Content-Length", 0))
-                                    content_type = resp.headers.get("Content-Type", "")
-                                    
-                                    if status == 200 and content_length > 0:
-                                        body = await resp.text()
-                                        if len(body.strip()) > 10:  # Not empty
-                                            return {
-                                                "path": path,
-                                                "status": status,
-                                                "size": len(body),
-                                                "content_type": content_type,
-                                                "preview": body[:200],
-                                            }
-                                    elif status in (301, 302, 303, 307, 308):
-                                        location = resp.headers.get("Location", "")
-                                        return {
-                                            "path": path,
-                                            "status": status,
-                                            "redirect": location,
-                                        }
-                            except Exception:
-                                pass
-                            return None
+                    discovered_urls.update(_normalize_url(link) for link in new_links if not _is_static_asset(link))
                     
-                    tasks = [probe_path(path) for path in self.SENSITIVE_PATHS]
-                    results = await asyncio.gather(*tasks)
+                    discovered_forms.extend(page_forms)
                     
-                    for result in results:
-                        if result:
-                            discovered_sensitive.append(result)
-                
-                await self.emit_event("INFO", f"Found {len(discovered_sensitive)} accessible sensitive paths")
-                await self.update_progress(70)
-                
-                # ===== Phase 6: Extract emails and data from page content =====
-                try:
-                    page_text = await page.evaluate("() => document.body.innerText")
-                    email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-                    emails = re.findall(email_pattern, page_text)
-                    for email in emails:
-                        discovered_emails.add(email)
                 except Exception:
-                    pass
-                
-                await self.update_progress(80)
-                
-                # ===== Report findings =====
-                
-                # Report: Sensitive paths found
-                for item in discovered_sensitive:
-                    path = item["path"]
-                    
-                    # Determine severity based on what was found
-                    if any(p in path for p in [".env", ".git", "backup", "dump", ".htpasswd"]):
-                        severity = "CRITICAL"
-                        title = f"Critical File Exposed: {path}"
-                    elif any(p in path for p in ["/admin", "/dashboard", "phpinfo", "actuator", "debug", "trace", "elmah"]):
-                        severity = "HIGH"
-                        title = f"Sensitive Endpoint Accessible: {path}"
-                    elif any(p in path for p in ["package.json", "composer.json", "Dockerfile", "config"]):
-                        severity = "MEDIUM"
-                        title = f"Configuration File Exposed: {path}"
-                    else:
-                        severity = "LOW"
-                        title = f"Information Disclosure: {path}"
-                    
-                    evidence = f"GET {path} returned HTTP {item['status']}"
-                    if "preview" in item:
-                        evidence += f" ({item['size']} bytes). Preview: {item['preview'][:150]}"
-                    elif "redirect" in item:
-                        evidence += f" → Redirects to {item['redirect']}"
-                    
-                    # Navigate to the path and screenshot for critical/high findings
-                    self.clear_steps()
-                    self.step(f"curl -I '{self.target_url.rstrip('/')}{path}'", f"HTTP {item['status']} — {item.get('size', '?')} bytes returned")
-                    if "preview" in item:
-                        self.step(f"curl -s '{self.target_url.rstrip('/')}{path}' | head -c 300", item['preview'][:200])
-                    await self.report_finding(
-                        severity=severity,
-                        title=title,
-                        evidence=evidence,
-                        recommendation=f"Remove or restrict access to {path}. If this file must exist, ensure it requires authentication."
-                    )
-                
-                # Report: Forms without CSRF tokens
-                csrf_missing = [f for f in discovered_forms if not f.get("has_csrf") and f.get("method") == "POST"]
-                if csrf_missing:
-                    form_details = "; ".join([
-                        f"POST {f.get('action', '?')} ({len(f.get('inputs', []))} inputs)"
-                        for f in csrf_missing[:5]
-                    ])
-                    self.clear_steps()
-                    self.step("Crawl all pages for <form> elements", f"Found {len(discovered_forms)} total forms")
-                    self.step("Check each POST form for CSRF token inputs", f"{len(csrf_missing)} form(s) missing CSRF protection")
-                    await self.report_finding(
-                        severity="MEDIUM",
-                        title=f"CSRF Protection Missing on {len(csrf_missing)} Form(s)",
-                        evidence=f"POST forms without CSRF tokens: {form_details}",
-                        recommendation="Add CSRF tokens to all state-changing forms. Use framework-provided CSRF protection (e.g., Django csrf_token, Express csurf)."
-                    )
-                
-                # Report: File upload forms
-                upload_forms = [f for f in discovered_forms if f.get("has_file_upload")]
-                if upload_forms:
-                    self.clear_steps()
-                    self.step("Scan all forms for <input type='file'>", f"Found {len(upload_forms)} form(s) with file upload capability")
-                    await self.report_finding(
-                        severity="MEDIUM",
-                        title="File Upload Endpoint Detected",
-                        evidence=f"Found {len(upload_forms)} form(s) with file upload capability. File uploads can be attack vectors for RCE if not properly validated.",
-                        recommendation="Validate file types server-side (not just by extension). Limit file sizes. Store uploads outside the web root. Scan uploads for malware."
-                    )
-                
-                # Report: Emails found (PII disclosure)
-                if discovered_emails:
-                    self.clear_steps()
-                    self.step("Extract text from page body", "Scanned all crawled pages for email patterns")
-                    self.step("Regex search: [a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}", f"Found {len(discovered_emails)} email(s): {', '.join(list(discovered_emails)[:3])}")
-                    await self.report_finding(
-                        severity="LOW",
-                        title="Email Addresses Disclosed in Page Content",
-                        evidence=f"Found {len(discovered_emails)} email(s) in page content: {', '.join(list(discovered_emails)[:5])}",
-                        recommendation="Consider obfuscating email addresses to prevent harvesting by spam bots."
-                    )
-                
-                await self.update_progress(90)
-                
-                # ===== Store attack surface data for other agents =====
-                surface_data = {
-                    "urls": list(discovered_urls)[:100],
-                    "forms": discovered_forms[:20],
-                    "apis": [{"url": r["url"], "method": r["method"]} for r in api_requests][:30],
-                    "tech_stack": list(discovered_tech),
-                    "sensitive_paths": discovered_sensitive[:20],
-                    "external_services": list(external_services)[:20],
-                    "emails": list(discovered_emails)[:10],
-                    "total_pages_crawled": len(visited),
-                    "total_urls_discovered": len(discovered_urls),
-                    "total_forms": len(discovered_forms),
-                    "total_api_endpoints": len(api_requests),
-                }
-                
-                # Store in run_events so frontend can display it
-                await self.emit_event("INFO", f"📊 Attack Surface Summary: {len(discovered_urls)} URLs, {len(discovered_forms)} forms, {len(api_requests)} API calls, {len(discovered_tech)} technologies")
-                
-                # Store the full surface data as a special event
-                await self.emit_event("ATTACK_SURFACE", "Attack surface mapping complete", surface_data)
+                    continue
                 
-                await self.update_progress(100)
-                await self.emit_event("SUCCESS", f"🕷️ Spider complete: Mapped {len(discovered_urls)} URLs across {len(visited)} pages")
-                
-            except Exception as e:
-                await self.emit_event("ERROR", f"Spider failed: {str(e)}")
-                raise e
-            finally:
-                await context.close()
-                await browser.close()
+                progress = 35 + int((idx / max(len(browser_frontier), 1)) * 20)
+                await self.update_progress(min(progress, 55))
+            
+            await self.emit_event("INFO", f"Crawled {len(visited)} pages, found {len(discovered_urls)} total URLs")
+            await self.update_progress(55)
+            
+            # ===== Phase 5: Collect sensitive path probes (started before Phase 4) =====
+            discovered_sensitive = await probe_task
+            
+            await self.emit_event("INFO", f"Found {len(discovered_sensitive)} accessible sensitive paths")
+            await self.update_progress(70)
+            
+            # ===== Phase 6: Extract emails and data from page content =====
+            try:
+                # Only the head of the page is needed — at most 10 emails are stored downstream
+                page_text = await page.evaluate(f"() => document.body.innerText.slice(0, {MAX_EMAIL_SCAN_CHARS})")
+                discovered_emails.update(
+                    m.group(0) for m in itertools.islice(_EMAIL_RE.finditer(page_text), MAX_EMAIL_MATCHES)
+                )
+            except Exception:
+                pass
+            
+            await self.update_progress(80)
+            
+            # ===== Report findings =====
+            
+            # Report: Sensitive paths found
+            for item in discovered_sensitive:
+                path = item["path"]
+                
+                # Determine severity based on what was found
+                if any(p in path for p in [".env", ".git", "backup", "dump", ".htpasswd"]):
+                    severity = "CRITICAL"
+                    title = f"Critical File Exposed: {path}"
+                elif any(p in path for p in ["/admin", "/dashboard", "phpinfo", "actuator", "debug", "trace", "elmah"]):
+                    severity = "HIGH"
+                    title = f"Sensitive Endpoint Accessible: {path}"
+                elif any(p in path for p in ["package.json", "composer.json", "Dockerfile", "config"]):
+                    severity = "MEDIUM"
+                    title = f"Configuration File Exposed: {path}"
+                else:
+                    severity = "LOW"
+                    title = f"Information Disclosure: {path}"
+                
+                evidence = f"GET {path} returned HTTP {item['status']}"
+                if "preview" in item:
+                    evidence += f" ({item['size']} bytes). Preview: {item['preview'][:150]}"
+                elif "redirect" in item:
+                    evidence += f" → Redirects to {item['redirect']}"
+                
+                # Navigate to the path and screenshot for critical/high findings
+                self.clear_steps()
+                self.step(f"curl -I '{self.target_url.rstrip('/')}{path}'", f"HTTP {item['status']} — {item.get('size', '?')} bytes returned")
+                if "preview" in item:
+                    self.step(f"curl -s '{self.target_url.rstrip('/')}{path}' | head -c 300", item['preview'][:200])
+                await self.report_finding(
+                    severity=severity,
+                    title=title,
+                    evidence=evidence,
+                    recommendation=f"Remove or restrict access to {path}. If this file must exist, ensure it requires authentication."
+                )
+            
+            # Report: Forms without CSRF tokens
+            csrf_missing = [f for f in discovered_forms if not f.get("has_csrf") and f.get("method") == "POST"]
+            if csrf_missing:
+                form_details = "; ".join([
+                    f"POST {f.get('action', '?')} ({len(f.get('inputs', []))} inputs)"
+                    for f in csrf_missing[:5]
+                ])
+                self.clear_steps()
+                self.step("Crawl all pages for <form> elements", f"Found {len(discovered_forms)} total forms")
+                self.step("Check each POST form for CSRF token inputs", f"{len(csrf_missing)} form(s) missing CSRF protection")
+                await self.report_finding(
+                    severity="MEDIUM",
+                    title=f"CSRF Protection Missing on {len(csrf_missing)} Form(s)",
+                    evidence=f"POST forms without CSRF tokens: {form_details}",
+                    recommendation="Add CSRF tokens to all state-changing forms. Use framework-provided CSRF protection (e.g., Django csrf_token, Express csurf)."
+                )
+            
+            # Report: File upload forms
+            upload_forms = [f for f in discovered_forms if f.get("has_file_upload")]
+            if upload_forms:
+                self.clear_steps()
+                self.step("Scan all forms for <input type='file'>", f"Found {len(upload_forms)} form(s) with file upload capability")
+                await self.report_finding(
+                    severity="MEDIUM",
+                    title="File Upload Endpoint Detected",
+                    evidence=f"Found {len(upload_forms)} form(s) with file upload capability. File uploads can be attack vectors for RCE if not properly validated.",
+                    recommendation="Validate file types server-side (not just by extension). Limit file sizes. Store uploads outside the web root. Scan uploads for malware."
+                )
+            
+            # Report: Emails found (PII disclosure)
+            if discovered_emails:
+                self.clear_steps()
+                self.step("Extract text from page body", "Scanned all crawled pages for email patterns")
+                self.step("Regex search: [a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\\.[a-zA-Z]{2,}", f"Found {len(discovered_emails)} email(s): {', '.join(list(discovered_emails)[:3])}")
+                await self.report_finding(
+                    severity="LOW",
+                    title="Email Addresses Disclosed in Page Content",
+                    evidence=f"Found {len(discovered_emails)} email(s) in page content: {', '.join(list(discovered_emails)[:5])}",
+                    recommendation="Consider obfuscating email addresses to prevent harvesting by spam bots."
+                )
+            
+            await self.update_progress(90)
+            
+            # ===== Store attack surface data for other agents =====
+            surface_data = {
+                "urls": list(discovered_urls)[:100],
+                "forms": discovered_forms[:20],
+                "apis": [{"url": r["url"], "method": r["method"]} for r in api_requests][:30],
+                "tech_stack": list(discovered_tech),
+                "sensitive_paths": discovered_sensitive[:20],
+                "external_services": list(external_services)[:20],
+                "emails": list(discovered_emails)[:10],
+                "total_pages_crawled": len(visited),
+                "total_urls_discovered": len(discovered_urls),
+                "total_forms": len(discovered_forms),
+                "total_api_endpoints": len(api_requests),
+            }
+            
+            # Store in run_events so frontend can display it
+            await self.emit_event("INFO", f"📊 Attack Surface Summary: {len(discovered_urls)} URLs, {len(discovered_forms)} forms, {len(api_requests)} API calls, {len(discovered_tech)} technologies")
+            
+            # Store the full surface data as a special event
+            await self.emit_event("ATTACK_SURFACE", "Attack surface mapping complete", surface_data)
+            
+            await self.update_progress(100)
+            await self.emit_event("SUCCESS", f"🕷️ Spider complete: Mapped {len(discovered_urls)} URLs across {len(visited)} pages")
+            
+        except Exception as e:
+            await self.emit_event("ERROR", f"Spider failed: {str(e)}")
+            raise e
+        finally:
+            if probe_task and not probe_task.done():
+                probe_task.cancel()
+            await context.close()
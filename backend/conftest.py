@@ -0,0 +1,6 @@
+"""Pytest setup shared by the backend tests."""
+import sys
+from unittest.mock import MagicMock
+
+# Stub the Supabase client before any test module imports agents (or db) during collection
+sys.modules.setdefault('db', MagicMock(supabase=MagicMock()))
@@ -4,18 +4,34 @@ Runs both Flask API and background worker in the same process.
 """
 import multiprocessing
 import os
-import asyncio
 from app import app
-from worker import worker_loop
+from worker import run_worker
 
 def run_flask():
-    """Run Flask API server"""
+    """Run the Flask API under gunicorn (preforked gthread workers).
+
+    Falls back to Flask's development server where gunicorn can't run (e.g. Windows).
+    """
     port = int(os.getenv('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        app.run(host='0.0.0.0', port=port)
+        return
+
+    class APIServer(BaseApplication):
+        def load_config(self):
+            self.cfg.set("bind", f"0.0.0.0:{port}")
+            self.cfg.set("workers", int(os.getenv("WEB_CONCURRENCY", 4)))
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", 8)
+            # Import app (Supabase/Gemini clients) once in the master; workers fork from it
+            self.cfg.set("preload_app", True)
+
+        def load(self):
+            return app
 
-def run_worker():
-    """Run background worker"""
-    asyncio.run(worker_loop())
+    APIServer().run()
 
 if __name__ == '__main__':
     # Start worker in a separate process
@@ -26,7 +26,9 @@ heavy_image = (
     .pip_install(
         "playwright",
         "aiohttp",
+        "aiodns",
         "beautifulsoup4",
+        "selectolax",
         "openai",
         "google-genai",
         "supabase",
@@ -42,6 +44,7 @@ light_image = (
     modal.Image.debian_slim(python_version="3.11")
     .pip_install(
         "aiohttp",
+        "aiodns",
         "beautifulsoup4",
         "supabase",
         "python-dotenv",
@@ -1,34 +1,13 @@
 
 import os
+import functools
 import google.generativeai as genai
 from db import supabase
 
-def generate_run_summary(run_id: str, target_url: str):
-    """
-    Generates a high-level security summary using Google Gemini.
-    """
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        print("Skipping summary: GEMINI_API_KEY not found.")
-        return
-
-    try:
-        # 1. Fetch all findings for this run
-        res = supabase.table('findings').select("*").eq("run_id", run_id).execute()
-        findings = res.data or []
-        
-        if not findings:
-            print("No findings to summarize.")
-            return
+SEVERITY_ORDER = {"CRITICAL": 0, "HIGH": 1, "MEDIUM": 2, "LOW": 3, "INFO": 4}
+MAX_PROMPT_FINDINGS = 200
 
-        # 2. Construct Prompt
-        finding_texts = []
-        for f in findings:
-            finding_texts.append(f"- [{f['severity']}] {f['title']}: {f['evidence'][:200]}...")
-        
-        findings_str = "\n".join(finding_texts)
-        
-        prompt = f"""
+PROMPT_TEMPLATE = """
         You are a Senior Staff Security Engineer at Google, responsible for summarizing security assessments for executive leadership.
         A recent security scan on {target_url} identified specific vulnerabilities.
 
@@ -48,9 +27,40 @@ def generate_run_summary(run_id: str, target_url: str):
         4. **Refusal**: If no meaningful risks were found, clearly state that the security posture appears robust based on this automated scan.
         """
 
+@functools.cache
+def _get_model(api_key: str):
+    """Configure Gemini once per key and reuse the model handle across summaries."""
+    genai.configure(api_key=api_key)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+def generate_run_summary(run_id: str, target_url: str):
+    """
+    Generates a high-level security summary using Google Gemini.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        print("Skipping summary: GEMINI_API_KEY not found.")
+        return
+
+    try:
+        # 1. Fetch all findings for this run (only the columns the prompt uses)
+        res = supabase.table('findings').select("severity,title,evidence").eq("run_id", run_id).execute()
+        findings = res.data or []
+        
+        if not findings:
+            print("No findings to summarize.")
+            return
+
+        # 2. Construct Prompt (most severe first, capped so prompt size stays bounded)
+        top = sorted(findings, key=lambda f: SEVERITY_ORDER.get(f['severity'], len(SEVERITY_ORDER)))[:MAX_PROMPT_FINDINGS]
+        findings_str = "\n".join(
+            f"- [{f['severity']}] {f['title']}: {(f.get('evidence') or '')[:200]}" for f in top
+        )
+
+        prompt = PROMPT_TEMPLATE.format(target_url=target_url, findings_str=findings_str)
+
         # 3. Call Gemini
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = _get_model(api_key)
         
         response = model.generate_content(prompt)
         summary_text = response.text
@@ -1,6 +1,8 @@
 import sys
 import os
 import asyncio
+import subprocess
+import threading
 import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
 
@@ -8,28 +10,47 @@ from unittest.mock import MagicMock, AsyncMock, patch
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 # Mock supabase BEFORE importing agents if they use it at module level
-mock_supabase = MagicMock()
-sys.modules['db'] = MagicMock(supabase=mock_supabase)
+# (conftest.py registers the stub under pytest; setdefault keeps `python test_agents.py` working)
+sys.modules.setdefault('db', MagicMock(supabase=MagicMock()))
+mock_supabase = sys.modules['db'].supabase
 
 # Import agents
 from agents.headers import HeadersAgent
 from agents.exposure import ExposureAgent
 from agents.auth_abuse import AuthAbuseAgent
 from agents.llm_analysis import LLMAnalysisAgent
+from agents.sqli import SQLiAgent, _SLOT
+from agents.spider import _FORM_ENUM_JS, _extract_links_and_forms, _normalize_url
+from playwright.async_api import async_playwright
+
+def _make_playwright(mock_page):
+    """Build the async_playwright() -> browser -> context -> page mock chain around a page."""
+    mock_context = AsyncMock()
+    mock_context.new_page.return_value = mock_page
+    mock_browser = AsyncMock()
+    mock_browser.new_context.return_value = mock_context
+    mock_playwright = AsyncMock()
+    mock_playwright.chromium.launch.return_value = mock_browser
+    mock_playwright.__aenter__ = AsyncMock(return_value=mock_playwright)
+    mock_playwright.__aexit__ = AsyncMock()
+    return mock_playwright
 
 class TestAgents(unittest.IsolatedAsyncioTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Patch BaseAgent methods to avoid DB calls (same mock for every test, so patch once)
+        cls.patcher1 = patch('agents.base.supabase', mock_supabase)
+        cls.patcher1.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.patcher1.stop()
+
     def setUp(self):
         self.run_id = "test-run-id"
         self.session_id = "test-session-id"
         self.target_url = "https://example.com"
 
-        # Patch BaseAgent methods to avoid DB calls
-        self.patcher1 = patch('agents.base.supabase', mock_supabase)
-        self.patcher1.start()
-
-    def tearDown(self):
-        self.patcher1.stop()
-
     async def test_headers_agent_noise_reduction(self):
         # Mock aiohttp response
         mock_headers = {
@@ -79,18 +100,7 @@ class TestAgents(unittest.IsolatedAsyncioTestCase):
         mock_page.title.return_value = "Home"
         mock_page.query_selector_all.return_value = [] # No forms
         mock_page.goto = AsyncMock()
-
-        mock_browser = AsyncMock()
-        mock_context = AsyncMock()
-        mock_context.new_page.return_value = mock_page
-        mock_context.close = AsyncMock()
-        mock_browser.new_context.return_value = mock_context
-        mock_browser.close = AsyncMock()
-
-        mock_playwright = AsyncMock()
-        mock_playwright.chromium.launch.return_value = mock_browser
-        mock_playwright.__aenter__ = AsyncMock(return_value=mock_playwright)
-        mock_playwright.__aexit__ = AsyncMock()
+        mock_playwright = _make_playwright(mock_page)
 
         with patch('agents.exposure.async_playwright', return_value=mock_playwright):
             agent.emit_event = AsyncMock()
@@ -111,18 +121,7 @@ class TestAgents(unittest.IsolatedAsyncioTestCase):
         mock_password_input = MagicMock()
         mock_page.query_selector_all.return_value = [mock_password_input]
         mock_page.goto = AsyncMock()
-
-        mock_browser = AsyncMock()
-        mock_context = AsyncMock()
-        mock_context.new_page.return_value = mock_page
-        mock_context.close = AsyncMock()
-        mock_browser.new_context.return_value = mock_context
-        mock_browser.close = AsyncMock()
-
-        mock_playwright = AsyncMock()
-        mock_playwright.chromium.launch.return_value = mock_browser
-        mock_playwright.__aenter__ = AsyncMock(return_value=mock_playwright)
-        mock_playwright.__aexit__ = AsyncMock()
+        mock_playwright = _make_playwright(mock_page)
 
         with patch('agents.auth_abuse.async_playwright', return_value=mock_playwright):
             agent.emit_event = AsyncMock()
@@ -158,18 +157,7 @@ class TestAgents(unittest.IsolatedAsyncioTestCase):
         mock_page = AsyncMock()
         mock_page.inner_text.return_value = "Page content"
         mock_page.goto = AsyncMock()
-
-        mock_browser = AsyncMock()
-        mock_context = AsyncMock()
-        mock_context.new_page.return_value = mock_page
-        mock_context.close = AsyncMock()
-        mock_browser.new_context.return_value = mock_context
-        mock_browser.close = AsyncMock()
-
-        mock_playwright = AsyncMock()
-        mock_playwright.chromium.launch.return_value = mock_browser
-        mock_playwright.__aenter__ = AsyncMock(return_value=mock_playwright)
-        mock_playwright.__aexit__ = AsyncMock()
+        mock_playwright = _make_playwright(mock_page)
 
         with patch('agents.llm_analysis.async_playwright', return_value=mock_playwright):
             agent.emit_event = AsyncMock()
@@ -185,5 +173,165 @@ class TestAgents(unittest.IsolatedAsyncioTestCase):
             self.assertEqual(call_kwargs['title'], "Test Finding")
             self.assertIn("Justification: Because reasons", call_kwargs['evidence'])
 
+    async def test_base_agent_batches_events(self):
+        agent = HeadersAgent(self.run_id, self.session_id, self.target_url)
+
+        with patch('agents.base.supabase') as db:
+            await agent.emit_event("INFO", "one")
+            await agent.emit_event("INFO", "two")
+            await agent.emit_event("WARNING", "three")
+            await agent.flush_events()
+
+            db.table.assert_called_once_with('run_events')
+            batch = db.table.return_value.insert.call_args.args[0]
+            self.assertEqual([e["message"] for e in batch], ["one", "two", "three"])
+
+    async def test_base_agent_coalesces_progress(self):
+        agent = HeadersAgent(self.run_id, self.session_id, self.target_url)
+
+        with patch('agents.base.supabase') as db:
+            for progress in (10, 12, 30, 55):
+                await agent.update_progress(progress)
+            await agent.flush_events()
+
+            update = db.table.return_value.update
+            update.assert_called_once_with({"progress": 55})
+
+    async def test_report_finding_keeps_its_own_steps(self):
+        agent = HeadersAgent(self.run_id, self.session_id, self.target_url)
+        agent._emit_repro_steps = AsyncMock()
+        inserted = threading.Event()
+        release = threading.Event()
+
+        def slow_insert():
+            inserted.set()
+            release.wait(5)
+            return MagicMock(data=[{"id": "finding-1"}])
+
+        with patch('agents.base.supabase') as db:
+            db.table.return_value.insert.return_value.execute = slow_insert
+            agent.step("curl one", "first")
+            report = asyncio.create_task(agent.report_finding("HIGH", "One", "e", "r"))
+            await asyncio.to_thread(inserted.wait, 5)
+            # Another worker of the same agent starts its own finding meanwhile
+            agent.clear_steps()
+            agent.step("curl two", "second")
+            release.set()
+            self.assertEqual(await report, "finding-1")
+
+        agent._emit_repro_steps.assert_awaited_once_with("finding-1", [{"command": "curl one", "output": "first"}])
+        self.assertEqual(agent._repro_steps, [{"command": "curl two", "output": "second"}])
+
+    async def test_sqli_time_based_blind_reports_only_repeatable_delays(self):
+        agent = SQLiAgent(self.run_id, self.session_id, self.target_url)
+        agent.emit_event = AsyncMock()
+        agent.report_finding = AsyncMock()
+
+        # Sleep probe response times per path, one entry per call; the last one repeats
+        sleep_timings = {
+            "/confirmed": [3.2],           # every probe sleeps
+            "/flaky": [3.2, 0.1],          # slow only in the concurrent pass
+            "/half": [3.2, 3.2, 0.1],      # slow in the concurrent pass and the first re-time only
+            "/down": [3.2],                # baseline request fails
+            "/fast": [0.1],
+        }
+        sleep_calls = {}
+
+        async def timed_get(session, sem, url):
+            path = url.split("?")[0].replace(self.target_url, "")
+            if url.endswith("?q=1"):
+                return None if path == "/down" else 0.1
+            n = sleep_calls[url] = sleep_calls.get(url, 0) + 1
+            timings = sleep_timings[path]
+            return timings[min(n, len(timings)) - 1]
+
+        agent._timed_get = timed_get
+        targets = [(path, f"{self.target_url}{path}?q=1", f"{self.target_url}{path}?q={_SLOT}") for path in sleep_timings]
+
+        self.assertTrue(await agent._time_based_blind(MagicMock(), asyncio.Semaphore(10), targets))
+
+        agent.report_finding.assert_awaited_once()
+        call = agent.report_finding.call_args.kwargs
+        self.assertEqual(call["title"], "SQL Injection — Time-Based Blind")
+        self.assertIn("at /confirmed", call["evidence"])
+        self.assertIn(f"{SQLiAgent.SLEEP_CONFIRM_ROUNDS} sequential", call["evidence"])
+        # /confirmed is reported after its first payload, so the second one is never re-timed
+        confirmed = [url for url in sleep_calls if url.startswith(f"{self.target_url}/confirmed")]
+        self.assertEqual(sorted(sleep_calls[url] for url in confirmed), [1, 1 + SQLiAgent.SLEEP_CONFIRM_ROUNDS])
+        # A failed baseline skips the target without re-timing it
+        self.assertTrue(all(n == 1 for url, n in sleep_calls.items() if "/down" in url))
+
+    async def test_sqli_time_based_blind_ignores_delays_under_threshold(self):
+        agent = SQLiAgent(self.run_id, self.session_id, self.target_url)
+        agent.emit_event = AsyncMock()
+        agent.report_finding = AsyncMock()
+
+        async def timed_get(session, sem, url):
+            # Slow baseline: the probe is slower, but by less than SLEEP_THRESHOLD
+            return 1.0 if url.endswith("?q=1") else 1.0 + SQLiAgent.SLEEP_THRESHOLD - 0.1
+
+        agent._timed_get = timed_get
+        targets = [("/search?q=", f"{self.target_url}/search?q=1", f"{self.target_url}/search?q={_SLOT}")]
+
+        self.assertFalse(await agent._time_based_blind(MagicMock(), asyncio.Semaphore(10), targets))
+        agent.report_finding.assert_not_awaited()
+
+    def test_xss_agent_imports_without_playwright(self):
+        # Fresh interpreter: this module itself has Playwright loaded already
+        check = (
+            "import sys; from unittest.mock import MagicMock; sys.modules['db'] = MagicMock(); "
+            "import agents.xss; sys.exit('playwright.async_api' in sys.modules)"
+        )
+        result = subprocess.run([sys.executable, "-c", check], cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(result.returncode, 0, "importing agents.xss loaded Playwright")
+
+    def test_spider_normalize_url_dedupes_variants(self):
+        variants = [
+            "https://Example.com/about/",
+            "HTTPS://example.com:443/about",
+            "https://example.com/about#team",
+            "https://example.com/about?ref=nav",
+        ]
+        self.assertEqual({_normalize_url(u) for u in variants}, {"https://example.com/about"})
+        self.assertEqual(_normalize_url("http://example.com:8080"), "http://example.com:8080/")
+
+    async def test_spider_http_forms_match_browser_enumeration(self):
+        page_url = "https://example.com/account"
+        html = """<html><body>
+            <form method="post" action="/profile" enctype="multipart/form-data">
+                <input type="hidden" name="csrf_token" value="abc">
+                <input type="EMAIL" name="email" placeholder="you@example.com" autocomplete="email" required>
+                <input type="bogus" id="nickname">
+                <input name="age">
+                <input type="file" name="avatar">
+                <textarea name="bio" placeholder="About you"></textarea>
+                <select name="tags" multiple><option>a</option></select>
+                <select name="country"><option>us</option></select>
+            </form>
+            <form method="PATCH"><input type="search" name="q"></form>
+        </body></html>"""
+
+        _, http_forms = _extract_links_and_forms(html, page_url, "example.com")
+        self.assertEqual([f["has_file_upload"] for f in http_forms], [True, False])
+        self.assertEqual([i["type"] for i in http_forms[0]["inputs"]],
+                         ["hidden", "email", "text", "text", "file", "textarea", "select-multiple", "select-one"])
+
+        # The browser is the reference for _FORM_ENUM_JS; skip that half where Chromium can't start
+        playwright = await async_playwright().start()
+        try:
+            try:
+                browser = await playwright.chromium.launch()
+            except Exception as e:
+                self.skipTest(f"Chromium unavailable: {e}")
+            page = await browser.new_page()
+            await page.route(page_url, lambda route: route.fulfill(body=html, content_type="text/html"))
+            await page.goto(page_url)
+            browser_forms = (await page.evaluate(_FORM_ENUM_JS))["forms"]
+            await browser.close()
+        finally:
+            await playwright.stop()
+
+        self.assertEqual(http_forms, browser_forms)
+
 if __name__ == '__main__':
     unittest.main()
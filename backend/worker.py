@@ -1,39 +1,66 @@
 import asyncio
 import time
 import os
+import functools
+import importlib
+import logging
 from db import supabase
 from dotenv import load_dotenv
 
-load_dotenv()
+try:
+    import uvloop  # libuv event loop; much higher aiohttp throughput than the default loop
+except ImportError:
+    uvloop = None
 
-USE_MODAL = os.getenv("USE_MODAL", "false").lower() == "true"
+load_dotenv()
 
-# ---------- Local agent imports ----------
-from agents.exposure_v2 import ExposureAgent
-from agents.headers_v2 import HeadersAgent
-from agents.auth_abuse import AuthAbuseAgent
-from agents.llm_analysis import LLMAnalysisAgent
-from agents.sqli import SQLiAgent
-from agents.xss import XSSAgent
-from agents.red_team import RedTeamAgent
-from agents.spider import SpiderAgent
-from agents.cors import CORSAgent
-from agents.portscan import PortScanAgent
+# Same format as the API (a no-op when app.py already configured logging in this process)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("sentinel.worker")
+logger.setLevel(os.getenv("SENTINEL_LOG_LEVEL", "INFO").upper())
 
+USE_MODAL = os.getenv("USE_MODAL", "false").lower() == "true"
+# Local agents each hold a browser context; cap how many run at once
+MAX_AGENT_CONCURRENCY = int(os.getenv("SENTINEL_MAX_CONCURRENCY", "4"))
+# Idle poll interval for QUEUED runs; while Realtime INSERT notifications are live the
+# poll is only a safety net, so it can be much slower
+IDLE_POLL_SECONDS = 2
+REALTIME_IDLE_POLL_SECONDS = float(os.getenv("WORKER_IDLE_POLL_SECONDS", "15"))
+# LLM agents share the Gemini request quota; a small cap keeps them under the RPM budget
+MAX_LLM_CONCURRENCY = int(os.getenv("SENTINEL_MAX_LLM_CONCURRENCY", "2"))
+
+# ---------- Local agents ----------
+from agents.shared import close_shared_resources
+
+# "module:Class" paths, imported on first use so the worker only loads the agents a run needs
 LOCAL_AGENT_MAP = {
-    "spider": SpiderAgent,
-    "exposure": ExposureAgent,
-    "headers_tls": HeadersAgent,
-    "cors": CORSAgent,
-    "portscan": PortScanAgent,
-    "auth_abuse": AuthAbuseAgent,
-    "llm_analysis": LLMAnalysisAgent,
-    "sqli": SQLiAgent,
-    "xss": XSSAgent,
-    "red_team": RedTeamAgent,
-    "custom": ExposureAgent,
+    "spider": "agents.spider:SpiderAgent",
+    "exposure": "agents.exposure_v2:ExposureAgent",
+    "headers_tls": "agents.headers_v2:HeadersAgent",
+    "cors": "agents.cors:CORSAgent",
+    "portscan": "agents.portscan:PortScanAgent",
+    "auth_abuse": "agents.auth_abuse:AuthAbuseAgent",
+    "llm_analysis": "agents.llm_analysis:LLMAnalysisAgent",
+    "sqli": "agents.sqli:SQLiAgent",
+    "xss": "agents.xss:XSSAgent",
+    "red_team": "agents.red_team:RedTeamAgent",
+    "custom": "agents.exposure_v2:ExposureAgent",
 }
 
+
+@functools.cache
+def _load_agent(path: str):
+    module, cls = path.split(":")
+    return getattr(importlib.import_module(module), cls)
+
+
+def get_agent_class(agent_type: str):
+    """Resolve an agent type to its class, falling back to ExposureAgent."""
+    return _load_agent(LOCAL_AGENT_MAP.get(agent_type, LOCAL_AGENT_MAP["exposure"]))
+
 # ---------- Modal dispatch ----------
 MODAL_AGENT_MAP = {}
 if USE_MODAL:
@@ -60,33 +87,60 @@ if USE_MODAL:
             try:
                 MODAL_AGENT_MAP[agent_type] = modal.Function.from_name(MODAL_APP_NAME, fn_name)
             except Exception as e:
-                print(f"⚠️  Could not find Modal function {fn_name}: {e}")
+                logger.warning("⚠️  Could not find Modal function %s: %s", fn_name, e)
 
-        print(f"✅ Modal dispatch enabled ({len(MODAL_AGENT_MAP)} functions found)")
+        logger.info("✅ Modal dispatch enabled (%d functions found)", len(MODAL_AGENT_MAP))
     except ImportError as e:
-        print(f"⚠️  Modal import failed ({e}), falling back to local execution")
+        logger.warning("⚠️  Modal import failed (%s), falling back to local execution", e)
         USE_MODAL = False
 
 SPIDER_AGENTS = {"spider"}
 LLM_AGENTS = {"llm_analysis", "red_team"}
 
 
-async def process_run_modal(run_id: str, target_url: str, sessions_data: list):
-    """Dispatch agents to Modal serverless functions."""
-    print(f"🚀 Processing run {run_id} via MODAL for {target_url}")
-
-    spider_sessions = []
-    non_llm_sessions = []
-    llm_sessions = []
-
+def _group_by_phase(sessions_data: list):
+    """Split sessions into (spider, non-LLM, LLM) phase lists without building any agents."""
+    phases = {"spider": [], "non_llm": [], "llm": []}
     for session in sessions_data:
         agent_type = session["agent_type"]
         if agent_type in SPIDER_AGENTS:
-            spider_sessions.append(session)
+            phases["spider"].append(session)
         elif agent_type in LLM_AGENTS:
-            llm_sessions.append(session)
+            phases["llm"].append(session)
         else:
-            non_llm_sessions.append(session)
+            phases["non_llm"].append(session)
+    return phases["spider"], phases["non_llm"], phases["llm"]
+
+
+async def _run_phase(coros: list, limit: int, failure_label: str):
+    """Run one phase's agents concurrently, at most `limit` at a time.
+
+    The TaskGroup keeps the phase structured (cancelling the run cancels every agent),
+    while each agent's failure is caught and logged in its own task so siblings keep going.
+    """
+    sem = asyncio.Semaphore(limit)
+
+    async def guarded(coro):
+        try:
+            async with sem:
+                await coro
+        except Exception as e:
+            logger.error("%s: %s", failure_label, e)
+        finally:
+            # No-op once it ran; avoids "never awaited" if the run is cancelled while it queued
+            if asyncio.iscoroutine(coro):
+                coro.close()
+
+    async with asyncio.TaskGroup() as tg:
+        for coro in coros:
+            tg.create_task(guarded(coro))
+
+
+async def process_run_modal(run_id: str, target_url: str, sessions_data: list):
+    """Dispatch agents to Modal serverless functions."""
+    logger.info("🚀 Processing run %s via MODAL for %s", run_id, target_url)
+
+    spider_sessions, non_llm_sessions, llm_sessions = _group_by_phase(sessions_data)
 
     # Phase 1: Spider first (maps attack surface)
     for session in spider_sessions:
@@ -94,11 +148,11 @@ async def process_run_modal(run_id: str, target_url: str, sessions_data: list):
         session_id = session["id"]
         modal_fn = MODAL_AGENT_MAP.get(agent_type)
         if modal_fn:
-            print(f"☁️  [Modal] Launching {agent_type} (session: {session_id})")
+            logger.info("☁️  [Modal] Launching %s (session: %s)", agent_type, session_id)
             try:
                 await modal_fn.remote.aio(run_id, session_id, target_url)
             except Exception as e:
-                print(f"❌ Spider agent {agent_type} failed on Modal: {e}")
+                logger.error("❌ Spider agent %s failed on Modal: %s", agent_type, e)
 
     # Phase 2: Non-LLM agents concurrently
     if non_llm_sessions:
@@ -108,78 +162,62 @@ async def process_run_modal(run_id: str, target_url: str, sessions_data: list):
             session_id = session["id"]
             modal_fn = MODAL_AGENT_MAP.get(agent_type)
             if modal_fn:
-                print(f"☁️  [Modal] Launching {agent_type} (session: {session_id})")
+                logger.info("☁️  [Modal] Launching %s (session: %s)", agent_type, session_id)
                 tasks.append(modal_fn.remote.aio(run_id, session_id, target_url))
             else:
-                print(f"⚠️  No Modal function for {agent_type}, running locally")
-                AgentClass = LOCAL_AGENT_MAP.get(agent_type, ExposureAgent)
+                logger.warning("⚠️  No Modal function for %s, running locally", agent_type)
+                AgentClass = get_agent_class(agent_type)
                 tasks.append(AgentClass(run_id, session_id, target_url).run())
-        await asyncio.gather(*tasks, return_exceptions=True)
+        # Remote agents hold no local resources, so the whole phase runs at once
+        await _run_phase(tasks, len(tasks), "❌ Agent failed on Modal")
 
-    # Phase 3: LLM agents sequentially (avoid rate-limit contention)
+    # Phase 3: LLM agents, at most MAX_LLM_CONCURRENCY at a time (avoid rate-limit contention)
+    llm_tasks = []
     for session in llm_sessions:
         agent_type = session["agent_type"]
         session_id = session["id"]
         modal_fn = MODAL_AGENT_MAP.get(agent_type)
         if modal_fn:
-            print(f"☁️  [Modal] Launching {agent_type} (session: {session_id})")
-            try:
-                await modal_fn.remote.aio(run_id, session_id, target_url)
-            except Exception as e:
-                print(f"❌ LLM agent {agent_type} failed on Modal: {e}")
+            logger.info("☁️  [Modal] Launching %s (session: %s)", agent_type, session_id)
+            llm_tasks.append(modal_fn.remote.aio(run_id, session_id, target_url))
+    await _run_phase(llm_tasks, MAX_LLM_CONCURRENCY, "❌ LLM agent failed on Modal")
 
 
 async def process_run_local(run_id: str, target_url: str, sessions_data: list):
     """Run agents locally (original behavior)."""
-    print(f"💻 Processing run {run_id} LOCALLY for {target_url}")
-
-    spider_tasks = []
-    non_llm_tasks = []
-    llm_sessions_list = []
-
-    for session in sessions_data:
-        agent_type = session["agent_type"]
-        session_id = session["id"]
+    logger.info("💻 Processing run %s LOCALLY for %s", run_id, target_url)
 
-        AgentClass = LOCAL_AGENT_MAP.get(agent_type, ExposureAgent)
-        agent_instance = AgentClass(run_id, session_id, target_url)
+    spider_sessions, non_llm_sessions, llm_sessions = _group_by_phase(sessions_data)
 
-        if agent_type in SPIDER_AGENTS:
-            spider_tasks.append(agent_instance)
-        elif agent_type in LLM_AGENTS:
-            llm_sessions_list.append(agent_instance)
-        else:
-            non_llm_tasks.append(agent_instance.run())
+    async def run_agent(session):
+        # The agent is built only when it gets to run, so queued agents hold no clients meanwhile
+        AgentClass = get_agent_class(session["agent_type"])
+        await AgentClass(run_id, session["id"], target_url).run()
 
     # Phase 1: Spider first
-    for spider in spider_tasks:
+    for session in spider_sessions:
         try:
-            await spider.run()
+            await run_agent(session)
         except Exception as e:
-            print(f"Spider Agent failed: {e}")
+            logger.error("Spider Agent failed: %s", e)
 
-    # Phase 2: Non-LLM agents concurrently
-    if non_llm_tasks:
-        await asyncio.gather(*non_llm_tasks)
+    # Phase 2: Non-LLM agents concurrently, at most MAX_AGENT_CONCURRENCY at a time
+    await _run_phase([run_agent(session) for session in non_llm_sessions], MAX_AGENT_CONCURRENCY, "Agent failed")
 
-    # Phase 3: LLM agents sequentially
-    for agent in llm_sessions_list:
-        try:
-            await agent.run()
-        except Exception as e:
-            print(f"LLM Agent {agent.__class__.__name__} failed: {e}")
+    # Phase 3: LLM agents, at most MAX_LLM_CONCURRENCY at a time
+    await _run_phase([run_agent(session) for session in llm_sessions], MAX_LLM_CONCURRENCY, "LLM Agent failed")
 
 
 async def process_run(run_id: str, target_url: str):
-    print(f"Processing Run: {run_id} for {target_url}")
+    logger.info("Processing Run: %s for %s", run_id, target_url)
 
-    # 1. Update Run Status to RUNNING
-    supabase.table("security_runs").update({"status": "RUNNING", "started_at": "now()"}).eq("id", run_id).execute()
-
-    # 2. Fetch Queued Sessions
-    sessions_response = supabase.table("agent_sessions").select("*").eq("run_id", run_id).eq("status", "QUEUED").execute()
+    # 1. Run Status is already RUNNING (set atomically by the claim_next_run RPC)
+    # 2. Fetch Queued Sessions (supabase-py blocks, so queries run in threads)
+    sessions_response = await asyncio.to_thread(
+        supabase.table("agent_sessions").select("*").eq("run_id", run_id).eq("status", "QUEUED").execute
+    )
     sessions_data = sessions_response.data
-    print(f"DEBUG: Found {len(sessions_data)} sessions for run {run_id}")
+    logger.debug("Found %d sessions for run %s", len(sessions_data), run_id)
 
     # 3. Dispatch
     if USE_MODAL:
@@ -188,27 +226,91 @@ async def process_run(run_id: str, target_url: str):
         await process_run_local(run_id, target_url, sessions_data)
 
     # 4. Update Run Status to COMPLETED
-    supabase.table("security_runs").update({"status": "COMPLETED", "ended_at": "now()"}).eq("id", run_id).execute()
-    print(f"✅ Run {run_id} Completed")
+    # finish_run RPC: one round-trip that also keeps a CANCELLED run cancelled and
+    # fails any session that never finished (e.g. no Modal function deployed for it)
+    await asyncio.to_thread(supabase.rpc("finish_run", {"p_run_id": run_id, "p_status": "COMPLETED"}).execute)
+    logger.info("✅ Run %s Completed", run_id)
+
+
+class _QueuedRunWatcher:
+    """Wakes the worker loop on security_runs INSERTs pushed by Supabase Realtime.
+
+    Polling stays as the fallback: every REALTIME_IDLE_POLL_SECONDS while subscribed,
+    every IDLE_POLL_SECONDS when Realtime is unavailable.
+    """
+
+    def __init__(self):
+        self.wakeup = asyncio.Event()
+        self.subscribed = False
+        self._client = None
+
+    async def start(self):
+        try:
+            from supabase import acreate_client
+            from db import url, key
+            self._client = await acreate_client(url, key)
+            channel = self._client.channel("worker-queued-runs")
+            channel.on_postgres_changes(
+                "INSERT", table="security_runs", schema="public",
+                callback=lambda _payload: self.wakeup.set(),
+            )
+            await channel.subscribe(self._on_state)
+        except Exception as e:
+            logger.warning("⚠️  Realtime unavailable (%s), polling every %ss", e, IDLE_POLL_SECONDS)
+
+    def _on_state(self, state, err=None):
+        self.subscribed = state == "SUBSCRIBED"
+
+    async def wait(self):
+        """Sleep until a run is inserted or the idle poll interval passes."""
+        timeout = REALTIME_IDLE_POLL_SECONDS if self.subscribed else IDLE_POLL_SECONDS
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def stop(self):
+        if self._client is not None:
+            await self._client.remove_all_channels()
 
 
 async def worker_loop():
     mode = "Modal" if USE_MODAL else "Local"
-    print(f"Worker started ({mode} Mode). Polling for QUEUED runs...")
-    while True:
-        try:
-            response = supabase.table("security_runs").select("*").eq("status", "QUEUED").limit(1).execute()
+    logger.info("Worker started (%s Mode). Polling for QUEUED runs...", mode)
+    watcher = _QueuedRunWatcher()
+    watch_task = asyncio.create_task(watcher.start())
+    try:
+        while True:
+            try:
+                # Clear before querying: an insert landing after the query still wakes wait()
+                watcher.wakeup.clear()
+                # Claim and mark RUNNING in one statement, so concurrent workers never share a run
+                response = await asyncio.to_thread(supabase.rpc("claim_next_run").execute)
 
-            if response.data:
-                run = response.data[0]
-                await process_run(run["id"], run["target_url"])
-            else:
-                await asyncio.sleep(2)
+                if response.data:
+                    run = response.data[0]
+                    await process_run(run["id"], run["target_url"])
+                else:
+                    await watcher.wait()
 
-        except Exception as e:
-            print(f"Worker Error: {e}")
-            await asyncio.sleep(5)
+            except Exception as e:
+                logger.error("Worker Error: %s", e)
+                await asyncio.sleep(5)
+    finally:
+        watch_task.cancel()
+        await watcher.stop()
+        # Shared browser / HTTP session outlive individual runs
+        await close_shared_resources()
+
+
+def run_worker():
+    """Run the worker loop, on uvloop when it is installed."""
+    if uvloop is not None:
+        uvloop.run(worker_loop())
+    else:
+        logger.warning("⚠️  uvloop not installed, running on the default asyncio event loop")
+        asyncio.run(worker_loop())
 
 
 if __name__ == "__main__":
-    asyncio.run(worker_loop())
+    run_worker()
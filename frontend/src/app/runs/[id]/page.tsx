@@ -73,6 +73,8 @@ export default function RunDetails() {
     const params = useParams();
     const runId = params.id as string;
     const eventsEndRef = useRef<HTMLDivElement>(null);
+    // created_at of the newest finding fetched so far; polls only ask for newer ones
+    const lastFindingAt = useRef<string | null>(null);
 
     const [run, setRun] = useState<SecurityRun | null>(null);
     const [sessions, setSessions] = useState<AgentSession[]>([]);
@@ -82,18 +84,33 @@ export default function RunDetails() {
 
     useEffect(() => {
         if (!runId) return;
+        lastFindingAt.current = null;
+
+        // Findings are never updated, so merge by id (realtime and polls can both deliver one)
+        const addFindings = (incoming: Finding[]) => setFindings((prev) => {
+            const seen = new Set(prev.map((f) => f.id));
+            const fresh = incoming.filter((f) => !seen.has(f.id));
+            return fresh.length ? [...prev, ...fresh] : prev;
+        });
 
         const fetchData = async () => {
+            let findQuery = supabase.from("findings").select("*").eq("run_id", runId).order("created_at", { ascending: true });
+            // gte, not gt: a finding sharing the last timestamp may not have been visible yet
+            if (lastFindingAt.current) findQuery = findQuery.gte("created_at", lastFindingAt.current);
             const [runRes, sessRes, eventRes, findRes] = await Promise.all([
                 supabase.from("security_runs").select("*").eq("id", runId).single(),
                 supabase.from("agent_sessions").select("*").eq("run_id", runId),
-                supabase.from("run_events").select("*").eq("run_id", runId).order("created_at", { ascending: true }).limit(200),
-                supabase.from("findings").select("*").eq("run_id", runId),
+                // Newest 200 events (same cap as the live buffer below), reversed to chronological order
+                supabase.from("run_events").select("*").eq("run_id", runId).order("created_at", { ascending: false }).limit(200),
+                findQuery,
             ]);
             if (runRes.data) setRun(runRes.data);
             if (sessRes.data) setSessions(sessRes.data);
-            if (eventRes.data) setEvents(eventRes.data);
-            if (findRes.data) setFindings(findRes.data);
+            if (eventRes.data) setEvents(eventRes.data.reverse());
+            if (findRes.data?.length) {
+                lastFindingAt.current = findRes.data[findRes.data.length - 1].created_at;
+                addFindings(findRes.data);
+            }
         };
         fetchData();
 
@@ -113,7 +130,7 @@ export default function RunDetails() {
             .on("postgres_changes", { event: "INSERT", schema: "public", table: "run_events", filter: `run_id=eq.${runId}` },
                 (payload) => { setEvents((prev) => [...prev, payload.new as RunEvent].slice(-200)); })
             .on("postgres_changes", { event: "INSERT", schema: "public", table: "findings", filter: `run_id=eq.${runId}` },
-                (payload) => { setFindings((prev) => [...prev, payload.new as Finding]); })
+                (payload) => { addFindings([payload.new as Finding]); })
             .subscribe();
 
         const interval = setInterval(fetchData, 3000);
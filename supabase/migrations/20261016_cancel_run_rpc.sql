@@ -0,0 +1,14 @@
+-- Migration: Add cancel_run RPC
+-- Created: 2026-10-16
+-- Description: Cancels a run and its agent sessions in one transaction, so the API
+-- needs one round-trip and a run is never CANCELLED while its sessions still run
+
+CREATE OR REPLACE FUNCTION cancel_run(p_run_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE security_runs SET status = 'CANCELLED' WHERE id = p_run_id;
+    UPDATE agent_sessions SET status = 'CANCELLED' WHERE run_id = p_run_id;
+END;
+$$;
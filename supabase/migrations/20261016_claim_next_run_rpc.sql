@@ -0,0 +1,19 @@
+-- Migration: Add claim_next_run RPC
+-- Created: 2026-10-16
+-- Description: Atomically claims the oldest QUEUED run (marks it RUNNING and returns it),
+-- so several workers can poll the same queue without picking up the same run
+
+CREATE OR REPLACE FUNCTION claim_next_run()
+RETURNS SETOF security_runs
+LANGUAGE sql
+AS $$
+    UPDATE security_runs SET status = 'RUNNING', started_at = NOW()
+    WHERE id = (
+        SELECT id FROM security_runs
+        WHERE status = 'QUEUED'
+        ORDER BY created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *;
+$$;
@@ -0,0 +1,23 @@
+-- Migration: Add create_run RPC
+-- Created: 2026-10-16
+-- Description: Creates a run and its agent sessions in one transaction, so the API
+-- needs one round-trip and the worker never sees a run without its sessions
+
+CREATE OR REPLACE FUNCTION create_run(p_target_url TEXT, p_agents TEXT[])
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_run_id UUID;
+BEGIN
+    INSERT INTO security_runs (target_url, status)
+    VALUES (p_target_url, 'QUEUED')
+    RETURNING id INTO v_run_id;
+
+    INSERT INTO agent_sessions (run_id, agent_type, status)
+    SELECT v_run_id, agent, 'QUEUED'
+    FROM unnest(p_agents) AS agent;
+
+    RETURN v_run_id;
+END;
+$$;
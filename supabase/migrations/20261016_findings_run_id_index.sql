@@ -0,0 +1,7 @@
+-- Migration: Index findings for incremental reads
+-- Created: 2026-10-16
+-- Description: The run page polls only findings newer than the last one it has
+-- (created_at >= cursor); this index serves that without scanning the whole table
+
+CREATE INDEX IF NOT EXISTS findings_run_id_created_at_idx
+    ON findings (run_id, created_at);
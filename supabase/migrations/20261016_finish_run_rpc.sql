@@ -0,0 +1,17 @@
+-- Migration: Add finish_run RPC
+-- Created: 2026-10-16
+-- Description: Closes out a run in one transaction: sets its final status (unless it
+-- was cancelled meanwhile) and fails any agent session that never reached a final state
+
+CREATE OR REPLACE FUNCTION finish_run(p_run_id UUID, p_status TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE security_runs SET status = p_status, ended_at = NOW()
+    WHERE id = p_run_id AND status <> 'CANCELLED';
+
+    UPDATE agent_sessions SET status = 'FAILED'
+    WHERE run_id = p_run_id AND status IN ('QUEUED', 'RUNNING');
+END;
+$$;
@@ -0,0 +1,13 @@
+-- Migration: Add remediation_cache table
+-- Created: 2026-10-16
+-- Description: Caches Gemini remediation advice per finding fingerprint
+-- (sha1 of title, severity and the first 200 chars of evidence) across runs
+
+CREATE TABLE IF NOT EXISTS remediation_cache (
+    fingerprint TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    remediation JSONB NOT NULL
+);
+
+ALTER TABLE remediation_cache ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Enable all for public" ON remediation_cache FOR ALL USING (true);
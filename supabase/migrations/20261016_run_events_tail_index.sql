@@ -0,0 +1,7 @@
+-- Migration: Index run_events for tail reads
+-- Created: 2026-10-16
+-- Description: The run page fetches the newest events of a run (ORDER BY created_at
+-- DESC LIMIT n); this index serves that without scanning the whole table
+
+CREATE INDEX IF NOT EXISTS run_events_run_id_created_at_idx
+    ON run_events (run_id, created_at DESC);
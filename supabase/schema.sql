@@ -37,6 +37,9 @@ CREATE TABLE IF NOT EXISTS run_events (
     data JSONB
 );
 
+-- The run page reads the newest events of a run (see migrations/20261016_run_events_tail_index.sql)
+CREATE INDEX IF NOT EXISTS run_events_run_id_created_at_idx ON run_events (run_id, created_at DESC);
+
 -- 4. Findings Table (Vulnerabilities)
 CREATE TABLE IF NOT EXISTS findings (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -49,6 +52,16 @@ CREATE TABLE IF NOT EXISTS findings (
     recommendation TEXT
 );
 
+-- The run page polls findings newer than a cursor (see migrations/20261016_findings_run_id_index.sql)
+CREATE INDEX IF NOT EXISTS findings_run_id_created_at_idx ON findings (run_id, created_at);
+
+-- 5. Remediation Cache (Gemini advice per finding fingerprint, reused across runs)
+CREATE TABLE IF NOT EXISTS remediation_cache (
+    fingerprint TEXT PRIMARY KEY,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    remediation JSONB NOT NULL
+);
+
 -- Realtime Enablement
 -- NOTE: You must also enable Realtime in the Supabase Dashboard for these tables!
 -- Go to Database -> Replication -> Source and toggle "Insert/Update/Delete" for:
@@ -67,6 +80,69 @@ CREATE POLICY "Enable all for public" ON run_events FOR ALL USING (true);
 ALTER TABLE findings ENABLE ROW LEVEL SECURITY;
 CREATE POLICY "Enable all for public" ON findings FOR ALL USING (true);
 
+ALTER TABLE remediation_cache ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Enable all for public" ON remediation_cache FOR ALL USING (true);
+
 -- Migrations
 ALTER TABLE security_runs ADD COLUMN IF NOT EXISTS configuration JSONB;
 
+-- Create a run and its agent sessions atomically (see migrations/20261016_create_run_rpc.sql)
+CREATE OR REPLACE FUNCTION create_run(p_target_url TEXT, p_agents TEXT[])
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_run_id UUID;
+BEGIN
+    INSERT INTO security_runs (target_url, status)
+    VALUES (p_target_url, 'QUEUED')
+    RETURNING id INTO v_run_id;
+
+    INSERT INTO agent_sessions (run_id, agent_type, status)
+    SELECT v_run_id, agent, 'QUEUED'
+    FROM unnest(p_agents) AS agent;
+
+    RETURN v_run_id;
+END;
+$$;
+
+-- Cancel a run and its agent sessions atomically (see migrations/20261016_cancel_run_rpc.sql)
+CREATE OR REPLACE FUNCTION cancel_run(p_run_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE security_runs SET status = 'CANCELLED' WHERE id = p_run_id;
+    UPDATE agent_sessions SET status = 'CANCELLED' WHERE run_id = p_run_id;
+END;
+$$;
+
+-- Finish a run and sweep unfinished sessions atomically (see migrations/20261016_finish_run_rpc.sql)
+CREATE OR REPLACE FUNCTION finish_run(p_run_id UUID, p_status TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE security_runs SET status = p_status, ended_at = NOW()
+    WHERE id = p_run_id AND status <> 'CANCELLED';
+
+    UPDATE agent_sessions SET status = 'FAILED'
+    WHERE run_id = p_run_id AND status IN ('QUEUED', 'RUNNING');
+END;
+$$;
+
+-- Claim the oldest queued run for one worker (see migrations/20261016_claim_next_run_rpc.sql)
+CREATE OR REPLACE FUNCTION claim_next_run()
+RETURNS SETOF security_runs
+LANGUAGE sql
+AS $$
+    UPDATE security_runs SET status = 'RUNNING', started_at = NOW()
+    WHERE id = (
+        SELECT id FROM security_runs
+        WHERE status = 'QUEUED'
+        ORDER BY created_at
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING *;
+$$;